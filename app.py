@@ -1,22 +1,75 @@
 import streamlit as st
 import pandas as pd
-import requests
-import json
 import time
 import pytz
-from datetime import datetime, timedelta
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import partial
+from datetime import datetime
+from chat_context import fit_chat_context
+from chat_parser import parse_query_date, extract_birth_info, NO_DATE, NOT_FOUND, date_parser_stats, birth_extractor_stats
+from gemini_client import get_client
+from prompts import REPORT_TEMPLATES, CHAT_TEMPLATE
 # saju_logic 모듈 함수 로드 (같은 폴더에 saju_logic.py가 있어야 함)
-from saju_logic import analyze_user, login_user, save_consultation, get_monthly_ganji, get_db_data, check_and_init_db
+from saju_logic import analyze_user, login_user, save_consultation, get_monthly_ganji_range, get_db_data, check_and_init_db, get_lucky_days, make_report_key, get_cached_report
+from saju_logic import get_pool, get_calendar_index, on_calendar_change, analyze_cache_stats, lucky_day_cache_stats, report_cache_stats
+from report_jobs import ReportJobQueue, JobLimitError
 
 # --- 설정 ---
 st.set_page_config(page_title="천기통달: 명리학 마스터", layout="wide")
 
-# DB 안전장치 가동
-check_and_init_db()
+# ==============================================================================
+# [캐시] 서버 프로세스 공용 자원(st.cache_resource) + 입력별 계산 결과(st.cache_data)
+# ==============================================================================
+RERUN_LOG = []   # 이번 rerun 에서 캐시에 없어서 실제로 계산한 항목 (이름, ms) - 스크립트가 다시 돌 때마다 새로 만들어짐
+TODAY_TTL = 600  # 초, 날짜에 따라 바뀌는 값(오늘의 간지)의 캐시 유지 시간
+
+@st.cache_resource(show_spinner=False)
+def recompute_totals():
+    # 서버 프로세스 전체의 항목별 재계산 횟수
+    return Counter()
+
+@contextmanager
+def track(name):
+    started = time.perf_counter()
+    try: yield
+    finally:
+        RERUN_LOG.append((name, (time.perf_counter() - started) * 1000))
+        recompute_totals()[name] += 1
+
+@st.cache_resource(show_spinner=False)
+def init_backend():
+    """서버 프로세스당 한 번: 운영 DB 스키마 확인, 연결 풀 생성, 만세력 인덱스 적재.
+    만세력이 바뀌면 입력별 계산 캐시(st.cache_data)도 함께 비우도록 등록합니다."""
+    with track("init_backend"):
+        errors = []
+        ok = check_and_init_db(on_error=errors.append)
+        if ok: on_calendar_change(st.cache_data.clear)
+        return {"ok": ok, "errors": errors, "pool": get_pool(), "calendar": get_calendar_index()}
+
+@st.cache_resource(show_spinner=False)
+def report_queue():
+    # 보고서 작업 워커 풀 (서버 프로세스당 하나, 한도는 SAJU_REPORT_WORKERS / SAJU_REPORT_JOBS_MAX / SAJU_REPORT_JOBS_PER_COUNSELOR)
+    return ReportJobQueue()
+
+# DB 안전장치 가동 (실패하면 사유를 표시하고 다음 rerun 때 다시 시도)
+backend = init_backend()
+if not backend["ok"]:
+    for message in backend["errors"]: st.error(message)
+    init_backend.clear()
 
 try: FIXED_API_KEY = st.secrets["GEMINI_API_KEY"]
 except: FIXED_API_KEY = "여기에_API_키를_붙여넣으세요"
 
+# Gemini 공용 클라이언트 (연결 재사용 / 마감 시간 / 재시도) 및 호출별 마감 시간(초)
+gemini = get_client(FIXED_API_KEY)
+EXTRACT_TIMEOUT = 15
+REPORT_TIMEOUT = 180
+CHAT_TIMEOUT = 90
+SUMMARY_TIMEOUT = 20
+JOB_POLL_SECONDS = 1.5  # 보고서 작업 진행 상황을 다시 읽는 간격
+
 # --- 세션 초기화 ---
 for k in ['chat_history', 'chat_input_manual']:
     if k not in st.session_state: st.session_state[k] = [] if k == 'chat_history' else None
@@ -26,54 +79,16 @@ if 'run_analysis' not in st.session_state: st.session_state['run_analysis'] = Fa
 if 'analysis_mode' not in st.session_state: st.session_state['analysis_mode'] = "lifetime"
 
 # ==============================================================================
-# [기능 1] 2026년 길일/흉일 정밀 산출
+# [기능 1] 연도별 길일/흉일 정밀 산출 (saju_logic.get_lucky_days 캐시 사용)
 # ==============================================================================
-def find_best_worst_days_2026(user_day_stem, user_day_branch):
-    branches = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
-    nobleman_map = {'甲': ['丑', '未'], '戊': ['丑', '未'], '庚': ['丑', '未'], '乙': ['子', '申'], '己': ['子', '申'], '丙': ['亥', '酉'], '丁': ['亥', '酉'], '壬': ['巳', '卯'], '癸': ['巳', '卯'], '辛': ['午', '寅']}
-    yuk_hap_map = {'子': '丑', '丑': '子', '寅': '亥', '亥': '寅', '卯': '戌', '戌': '卯', '辰': '酉', '酉': '辰', '巳': '申', '申': '巳', '午': '未', '未': '午'}
-    
-    my_branch_idx = branches.index(user_day_branch)
-    chung_branch = branches[(my_branch_idx + 6) % 12]
-    yuk_hai_map = {'子': '未', '丑': '午', '寅': '巳', '巳': '寅', '卯': '辰', '辰': '卯', '申': '亥', '亥': '申', '酉': '戌', '戌': '酉', '午': '丑', '未': '子'}
-    xing_map = {'寅': ['巳', '申'], '巳': ['寅', '申'], '申': ['寅', '巳'], '丑': ['戌', '未'], '戌': ['丑', '未'], '未': ['丑', '戌'], '子': ['卯'], '卯': ['子'], '辰': ['辰'], '午': ['午'], '酉': ['酉'], '亥': ['亥']}
-    
-    stems = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
-    stem_idx = stems.index(user_day_stem)
-    branch_idx = branches.index(user_day_branch)
-    diff = (branch_idx - stem_idx)
-    if diff < 0: diff += 12
-    gongmang_table = {10: ['戌', '亥'], 8: ['申', '酉'], 6: ['午', '未'], 4: ['辰', '巳'], 2: ['寅', '卯'], 0: ['子', '丑']}
-    my_gongmang = gongmang_table.get(diff, [])
-
+def find_best_worst_days(user_day_stem, user_day_branch, year):
     found_good = []
     found_bad = []
     
-    start_date = datetime(2026, 1, 1)
-    for i in range(365): 
-        curr = start_date + timedelta(days=i)
-        row = get_db_data(curr.year, curr.month, curr.day, False)
-        
-        if row:
-            day_ganji = row[4] 
-            day_branch = day_ganji[1]
-            date_str = curr.strftime("%m월 %d일")
-            
-            # 길일
-            is_good = False
-            reasons_good = []
-            if day_branch in nobleman_map.get(user_day_stem, []): reasons_good.append("천을귀인")
-            if yuk_hap_map.get(user_day_branch) == day_branch: reasons_good.append("육합")
-            if reasons_good: found_good.append(f"{date_str}({day_ganji}: {','.join(reasons_good)})")
-
-            # 흉일
-            is_bad = False
-            reasons_bad = []
-            if day_branch == chung_branch: reasons_bad.append("충")
-            if day_branch in my_gongmang: reasons_bad.append("공망")
-            if yuk_hai_map.get(user_day_branch) == day_branch: reasons_bad.append("육해")
-            if day_branch in xing_map.get(user_day_branch, []): reasons_bad.append("형살")
-            if reasons_bad: found_bad.append(f"{date_str}({day_ganji}: {','.join(reasons_bad)})")
+    for day in get_lucky_days(user_day_stem, user_day_branch, year):
+        date_str = day['date'].strftime("%m월 %d일")
+        if day['good']: found_good.append(f"{date_str}({day['ganji']}: {','.join(day['good'])})")
+        if day['bad']: found_bad.append(f"{date_str}({day['ganji']}: {','.join(day['bad'])})")
 
     def sample_dates(date_list, count=12):
         if not date_list: return []
@@ -86,6 +101,21 @@ def find_best_worst_days_2026(user_day_stem, user_day_branch):
             
     return final_good, final_bad
 
+# ==============================================================================
+# [보고서 작업] 백그라운드 작업의 진행 상황 표시 (이 부분만 주기적으로 다시 그림)
+# ==============================================================================
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def report_job_progress(job_id):
+    job = report_queue().get(job_id)
+    if job is None or job['status'] not in ("queued", "running"):
+        # 끝났으면 전체 화면을 다시 그려서 보고서/오류를 표시
+        st.rerun()
+    if job['status'] == "queued":
+        st.caption("보고서 작성 대기 중입니다... (다른 화면으로 이동하거나 새로고침해도 작업은 계속됩니다)")
+    else:
+        st.caption("마스터가 데이터를 분석하고 보고서를 작성 중입니다... (다른 화면으로 이동하거나 새로고침해도 작업은 계속됩니다)")
+    if job['partial']: st.markdown(job['partial'])
+
 # ==============================================================================
 # [기능 2] 날짜 파싱 → DB 데이터 매핑 (오늘/내일 처리 강화)
 # ==============================================================================
@@ -93,9 +123,10 @@ def get_db_ganji_for_query(query_text):
     kst = pytz.timezone('Asia/Seoul')
     now = datetime.now(kst)
     today_str = now.strftime('%Y년 %m월 %d일')
-    
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={FIXED_API_KEY}"
-    headers = {'Content-Type': 'application/json'}
+
+    # 오늘/내일/모레, "5월 5일" 같은 흔한 표현은 로컬 해석기로 바로 처리 (판단 불가일 때만 LLM)
+    local_date = parse_query_date(query_text, now)
+    if local_date == NO_DATE: return ""
     
     prompt = f"""
     Current Reference Time (KST): {now.strftime('%Y-%m-%d %H:%M:%S')} (Today is {today_str})
@@ -113,13 +144,14 @@ def get_db_ganji_for_query(query_text):
     """
     
     try:
-        r = requests.post(url, headers=headers, json={"contents": [{"parts": [{"text": prompt}]}]})
-        content = r.json()['candidates'][0]['content']['parts'][0]['text']
-        res_json = json.loads(content.replace("```json", "").replace("```", "").strip())
-        
-        if not res_json.get('found', False): return ""
-        
-        t_y, t_m, t_d = int(res_json['year']), int(res_json['month']), int(res_json['day'])
+        if local_date:
+            t_y, t_m, t_d = local_date.year, local_date.month, local_date.day
+        else:
+            res_json = gemini.generate_json(prompt, timeout=EXTRACT_TIMEOUT)
+            
+            if not res_json.get('found', False): return ""
+            
+            t_y, t_m, t_d = int(res_json['year']), int(res_json['month']), int(res_json['day'])
         row = get_db_data(t_y, t_m, t_d, False)
         
         if row:
@@ -138,10 +170,12 @@ def get_db_ganji_for_query(query_text):
 def extract_and_analyze_target(text):
     """
     사용자 입력 텍스트에서 '다른 사람'의 생년월일이 보이면 즉시 DB를 돌려 사주를 뽑아냅니다.
+    날짜처럼 보이는 토큰이 없으면 바로 종료하고, "남편 1973년 11월 30일 음력 오전 6시"처럼
+    로컬 규칙으로 확정되는 경우는 LLM 호출 없이 처리합니다.
     """
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={FIXED_API_KEY}"
-    headers = {'Content-Type': 'application/json'}
-    
+    local_info = extract_birth_info(text)
+    if local_info == NOT_FOUND: return ""
+
     prompt = f"""
     Task: Extract birth info from text: "{text}"
     
@@ -151,28 +185,29 @@ def extract_and_analyze_target(text):
     Rules:
     - Year: 4 digits (e.g., 73 -> 1973)
     - Lunar: true if '음력' mentioned, else false.
+    - Leap: true if '윤달' or '윤월' mentioned (lunar leap month), else false.
     - Time: Extract hour (0-23). If '오전 6시' -> 6. If unknown -> 0.
     - Gender: Guess from context (husband/son -> male, wife/daughter -> female). Default 'male'.
     - If NO birth date is present, return "found": false.
     
     Return JSON ONLY:
-    {{"found": true, "relation": "남편", "year": 1973, "month": 11, "day": 30, "hour": 6, "lunar": true, "gender": "남성"}}
+    {{"found": true, "relation": "남편", "year": 1973, "month": 11, "day": 30, "hour": 6, "lunar": true, "leap": false, "gender": "남성"}}
     """
     
     try:
-        r = requests.post(url, headers=headers, json={"contents": [{"parts": [{"text": prompt}]}]})
-        res_json = json.loads(r.json()['candidates'][0]['content']['parts'][0]['text'].replace("```json", "").replace("```", "").strip())
+        res_json = local_info or gemini.generate_json(prompt, timeout=EXTRACT_TIMEOUT)
         
         if res_json.get("found"):
             # 시스템이 직접 계산 (analyze_user 호출)
             y, m, d = res_json['year'], res_json['month'], res_json['day']
             h = res_json.get('hour', 0)
             is_lunar = res_json.get('lunar', False)
+            is_leap = is_lunar and res_json.get('leap', False)
             gender = res_json.get('gender', '남성')
             relation = res_json.get('relation', '상대방')
             
             # DB 조회 및 사주 산출
-            target_res = analyze_user(y, m, d, h, is_lunar, gender)
+            target_res = analyze_user(y, m, d, h, is_lunar, gender, is_leap)
             
             if "error" in target_res:
                 return f"\n[시스템 알림] {relation}의 정보를 조회하려 했으나 실패했습니다: {target_res['error']}"
@@ -186,7 +221,7 @@ def extract_and_analyze_target(text):
 시스템이 사용자가 입력한 정보를 바탕으로 이미 만세력을 계산했습니다.
 AI는 "계산 기능이 없다"고 말하면 안 됩니다. 아래 데이터를 즉시 분석에 사용하십시오.
 
-1. 대상: {relation} ({gender}, {y}년 {m}월 {d}일 {h}시생, {'음력' if is_lunar else '양력'})
+1. 대상: {relation} ({gender}, {y}년 {m}월 {d}일 {h}시생, {('음력(윤달)' if is_leap else '음력') if is_lunar else '양력'})
 2. **사주 원국 (확정값):** {target_res['사주']}
 3. **대운 흐름:** {target_res['대운']}
 
@@ -200,15 +235,68 @@ AI는 "계산 기능이 없다"고 말하면 안 됩니다. 아래 데이터를
     except Exception as e: 
         return ""
 
+# ==============================================================================
+# [기능 4] 채팅 전처리 (타인 사주 추출 + 날짜 질문 분석) 동시 실행
+# ==============================================================================
+CHAT_PREP_TIMEOUT = 20  # 초, 두 요청이 공유하는 마감 시간
+
+def gather_chat_context(prompt, timeout=CHAT_PREP_TIMEOUT):
+    """두 Gemini 추출 요청을 동시에 보내고, 각자 결과가 오는 즉시 DB 조회까지 이어서 처리합니다.
+    마감 시간 안에 끝나지 않은 쪽은 빈 문자열로 처리합니다."""
+    pool = ThreadPoolExecutor(max_workers=2)
+    target_future = pool.submit(extract_and_analyze_target, prompt)
+    query_future = pool.submit(get_db_ganji_for_query, prompt)
+    done, _ = wait([target_future, query_future], timeout=timeout)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    def result(future):
+        if future not in done: return ""
+        try: return future.result()
+        except Exception: return ""
+    return result(target_future), result(query_future)
+
+def summarize_chat_turns(prev_summary, turns):
+    """오래된 채팅 기록을 이전 요약에 이어서 짧게 누적 요약합니다 (chat_context 에서 호출)"""
+    turns_text = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+    prompt = f"""
+    아래는 명리 상담 채팅의 이전 요약과 그 뒤에 이어진 대화입니다.
+    두 내용을 합쳐 상담 맥락(질문 주제, 이미 제시한 판단과 시기, 제3자 사주 정보)을 한국어 10줄 이내로 요약하시오.
+    요약문만 출력하시오.
+
+    [이전 요약]
+    {prev_summary or "(없음)"}
+
+    [이어진 대화]
+    {turns_text}
+    """
+    return gemini.generate(prompt, timeout=SUMMARY_TIMEOUT)
+
 def get_yearly_detailed_flow(year):
     flow_text = f"\n[☆ {year}년 월별 상세 흐름 (DB 기반)]\n"
     try:
-        for m in range(1, 13):
-            data = get_monthly_ganji(year, m)
-            if data: flow_text += f"- {m}월: {data['month_ganji']} (세운 {data['year_ganji']}과의 관계)\n"
+        # 월별 간지 표에서 한 해치를 한 번에 읽음
+        for (_, m), data in sorted(get_monthly_ganji_range(year).items()):
+            flow_text += f"- {m}월: {data['month_ganji']} (세운 {data['year_ganji']}과의 관계)\n"
         return flow_text
     except: return ""
 
+# 입력이 같으면 결과가 같은 계산은 st.cache_data 로 재사용 (버튼을 눌러 rerun 해도 다시 계산하지 않음)
+@st.cache_data(show_spinner=False, max_entries=2048)
+def cached_analyze_user(year, month, day, hour, is_lunar, gender, is_leap):
+    with track("analyze_user"): return analyze_user(year, month, day, hour, is_lunar, gender, is_leap)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_yearly_flow(year):
+    with track("yearly_flow"): return get_yearly_detailed_flow(year)
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def cached_best_worst_days(user_day_stem, user_day_branch, year):
+    with track("lucky_days"): return find_best_worst_days(user_day_stem, user_day_branch, year)
+
+@st.cache_data(show_spinner=False, ttl=TODAY_TTL)
+def cached_day_row(year, month, day):
+    with track("today_ganji"): return get_db_data(year, month, day, False)
+
 # ==========================================
 # 메인 UI
 # ==========================================
@@ -242,6 +330,7 @@ else:
         gender = st.radio("성별", ["남성", "여성"], horizontal=True)
         calendar_type = st.radio("달력", ["양력", "음력"], horizontal=True)
         is_lunar = (calendar_type == "음력")
+        is_leap = st.checkbox("윤달", value=False) if is_lunar else False
         
         c1, c2 = st.columns(2)
         # [수정] 2026년까지 입력 가능하도록 max_value 추가
@@ -255,6 +344,7 @@ else:
             st.session_state['run_analysis'] = True
             st.session_state['analysis_mode'] = "2026_fortune"
             st.session_state['chat_history'] = []
+            st.session_state.pop('chat_summary', None)  # 이전 내담자 대화 요약이 새 프롬프트에 섞이지 않도록
             st.session_state.pop('lifetime_script', None)
             st.rerun()
 
@@ -266,13 +356,15 @@ else:
                 st.session_state['run_analysis'] = True
                 st.session_state['analysis_mode'] = "lifetime" 
                 st.session_state['chat_history'] = []
+                st.session_state.pop('chat_summary', None)
                 st.rerun()
 
         st.markdown("---")
         if st.button("📜 정통 평생 심층 분석 (일반)", type="primary"):
             st.session_state['run_analysis'] = True
             st.session_state['analysis_mode'] = "lifetime"
-            st.session_state['chat_history'] = [] 
+            st.session_state['chat_history'] = []
+            st.session_state.pop('chat_summary', None)
             st.session_state.pop('lifetime_script', None)
             st.rerun()
 
@@ -283,11 +375,8 @@ else:
             st.error("API 키 오류")
             st.stop()
 
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={FIXED_API_KEY}"
-        headers = {'Content-Type': 'application/json'}
-
         # DB 원국 산출
-        result = analyze_user(birth_date.year, birth_date.month, birth_date.day, birth_time.hour, is_lunar, gender)
+        result = cached_analyze_user(birth_date.year, birth_date.month, birth_date.day, birth_time.hour, is_lunar, gender, is_leap)
         
         if "error" in result:
             st.error(result["error"])
@@ -312,523 +401,62 @@ else:
                 # [MODE 1] ★★★ 강화된 평생 심층 분석 프롬프트
                 if st.session_state['analysis_mode'] == "lifetime":
                     now = datetime.now()
-                    yearly_data = get_yearly_detailed_flow(now.year)
+                    yearly_data = cached_yearly_flow(now.year)
                     
-                    system_instruction = f"""
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[AI 시스템 역할 정의]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-당신은 40년 경력의 최고급 명리학 마스터입니다.
-
-**핵심 원칙:**
-1. 당신은 만세력 계산 능력이 없습니다 - 오직 시스템이 제공한 DB 데이터만 사용
-2. 날짜 관련 질문 시 제공된 간지 데이터만 사용, 절대 재계산 금지
-3. 추상적 위로는 배제하고, 냉철한 논리와 팩트로 분석
-4. 인평명리, 궁통보감, 적천수를 기반으로 한 정통 명리학 적용
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[내담자 기본 데이터]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-성명: {name} ({gender}, 만 {current_age}세)
-사주 명식: {result['사주']}
-대운 흐름: {result['대운']} 
-  ※ 숫자는 한국 나이 시작점 (예: '4(갑자)' → 4세~13세)
-금년 데이터: {yearly_data}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[명리학 분석 프레임워크 - 반드시 모두 적용]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-### 1. 오행 분석 (Five Elements)
-- 목(木), 화(火), 토(土), 금(金), 수(水)의 개수와 강약 파악
-- 편중된 오행과 부족한 오행 식별
-- 예: "목 3, 화 2, 토 1, 금 1, 수 1 → 목왕(木旺), 금수 부족"
-
-### 2. 용신론 (God of Use)
-- 일간(日干)의 강약 판단 (신왕/신약)
-- 용신(用神): 명식을 조화롭게 만드는 핵심 오행
-- 희신(喜神): 용신을 돕는 오행
-- 기신(忌神): 해가 되는 오행
-- 예: "일간 갑목 신왕 → 용신은 경금(관성), 희신은 토(재성)"
-
-### 3. 격국론 (Pattern Analysis)
-- 정격(正格): 정관격, 정재격, 식신격, 정인격 등
-- 특수격: 종격(從格), 화격(化格), 양인격(羊刃格) 등
-- 격국 성립 여부와 파격(破格) 요소 분석
-- 예: "식신생재격 성립, 단 관성이 식신을 극하여 파격 우려"
-
-### 4. 육신론 (Six Relations)
-- 비겁(比劫): 형제, 경쟁자
-- 식상(食傷): 자식, 표현력, 재능
-- 재성(財星): 재물, 배우자(남성)
-- 관성(官星): 직장, 명예, 배우자(여성)
-- 인성(印星): 학문, 어머니, 보호자
-
-각 육신의 강약과 위치(연/월/일/시)에 따른 의미 해석
-예: "월지 정재 → 부모 덕, 재물운 길상"
-
-### 5. 십이운성 (Twelve Life Cycles)
-장생(長生), 목욕(沐浴), 관대(冠帶), 건록(建祿), 제왕(帝旺), 
-쇠(衰), 병(病), 사(死), 묘(墓), 절(絕), 태(胎), 양(養)
-- 각 기둥의 십이운성을 분석하여 생애 흐름 파악
-- 예: "일지 제왕 → 중년 대성, 시지 쇠 → 만년 쇠퇴 주의"
-
-### 6. 신살론 (Spirit Stars)
-- 길신: 천을귀인, 천덕귀인, 월덕귀인, 문창귀인, 학당, 금여록
-- 흉살: 도화살, 역마살, 백호대살, 양인살, 괴강살, 공망
-- 각 신살의 작용과 영향력 해석
-- 예: "천을귀인 2개 → 위기 시 귀인 조력, 도화살 → 이성 인연 복잡"
-
-### 7. 합충형해파해 (Combinations & Clashes)
-- 합(合): 천간합, 지지합(육합, 삼합, 방합)
-- 충(沖): 지지충 (자오충, 축미충 등)
-- 형(刑): 삼형, 자형
-- 해(害): 육해
-- 파(破): 지지파
-- 각각의 작용력과 길흉 판단
-
-### 8. 조후론 (Climate Adjustment)
-- 출생 계절(춘하추동)에 따른 오행 선호
-- 한난조습(寒暖燥濕) 균형 필요
-- 예: "동생(冬生) 수왕 → 화(火)로 조후 필수"
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[분석 프로토콜 - 단계별 실행]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-**STEP 1. 원국 정밀 구조 분석**
-- 일간 파악 및 강약 판단
-- 오행 분포와 편중도
-- 격국 성립 여부
-- 용신/희신/기신 선정
-- 조후 필요성
-
-**STEP 2. 육신 및 십이운성 분석**
-- 각 기둥(년/월/일/시)의 육신 배치
-- 십이운성을 통한 생애 곡선 예측
-- 신살의 영향력
-
-**STEP 3. ★ 과거 대운 검증 (Past Verification)**
-지나온 각 대운의 나이 구간을 정확히 명시하고:
-- 해당 대운의 희기(喜忌) 판별
-- 그 시기에 발생했을 구체적 사건 예측
-  (학업, 부모, 재물, 건강, 관재수, 이동, 인연 등)
-- "00세~00세(00대운)는 ~~한 시기였으므로 ~~한 일이 있었을 것"
-- 팩트 체크하듯 상세히 서술
-
-**STEP 4. 현재 및 미래 대운 예측**
-- 현재 대운의 길흉과 주의사항
-- 향후 10년, 20년 흐름 전망
-- 세운(년운)과의 상호작용
-
-**STEP 5. 실전 인생 전략**
-- 용신 개운법 (직업, 방위, 색상, 이름 등)
-- 시기별 행동 지침
-- 경계해야 할 시기와 사항
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[출력 형식 - 엄격히 준수]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-## Part 1: 명리학 전문 분석서 (상담원 내부 학습용)
-
-### 📘 1) 원국 구조 심층 분석
-
-**1-1. 일간 및 오행 분포**
-- 일간(日干): [예: 甲木]
-- 오행 개수: 목 X, 화 X, 토 X, 금 X, 수 X
-- 오행 강약: [왕상휴수사 판단]
-- 편중 분석: [어느 오행이 과다/부족한지]
-
-**1-2. 격국 판정**
-- 격국명: [예: 식신생재격]
-- 성격 여부: [성격/파격 판단 및 근거]
-- 격국 특성: [해당 격국의 성향과 인생 패턴]
-
-**1-3. 용신 체계**
-- 용신(用神): [핵심 필요 오행]
-- 희신(喜神): [용신 보조 오행]
-- 기신(忌神): [해로운 오행]
-- 선정 근거: [왜 이것이 용신인지 명리학적 설명]
-
-**1-4. 조후 분석**
-- 출생 계절: [춘/하/추/동]
-- 한난조습: [사주의 온도와 습도]
-- 조후용신: [계절 조절에 필요한 오행]
-
-### 📗 2) 육신 및 십이운성 배치
-
-**2-1. 사주 기둥별 육신**
-년주: [간지] - [육신] - [의미] 월주: [간지] - [육신] - [의미] 일주: [간지] - [육신] - [의미] 시주: [간지] - [육신] - [의미]
-
-
-**2-2. 십이운성 분석**
-- 년지 운성: [장생/목욕/...] → [유년기 특성]
-- 월지 운성: [운성명] → [청년기 특성]
-- 일지 운성: [운성명] → [중년기 특성]
-- 시지 운성: [운성명] → [노년기 특성]
-
-**2-3. 신살 목록**
-- 길신: [천을귀인, 월덕귀인 등 나열 및 작용]
-- 흉살: [도화살, 역마살 등 나열 및 주의사항]
-
-### 📙 3) 과거 대운 정밀 검증
-
-[현재 나이 {current_age}세 기준, 지나온 대운들을 역산하여 분석]
-
-**첫 번째 대운: X세~X세 ([간지]대운)**
-- 희기 판단: [용신과의 관계 → 희운/기운]
-- 오행 작용: [이 대운의 오행이 원국에 미친 영향]
-- 예상 사건:
-  * 학업: [성적 상승/하락, 진학 여부]
-  * 가족: [부모와의 관계, 형제 문제]
-  * 건강: [질병 가능성, 사고 위험]
-  * 기타: [이사, 이동, 특이사항]
-
-**두 번째 대운: X세~X세 ([간지]대운)**
-[동일한 형식으로 분석]
-
-**현재 대운: X세~X세 ([간지]대운)**
-- 현재 상황 진단
-- 주요 이슈와 대응 전략
-
-### 📕 4) 미래 대운 및 세운 전망
-
-**향후 10년 (20XX~20XX)**
-- 대운: [간지] - [길흉 판단]
-- 주요 흐름: [재물/사업/건강/인연 등]
-- 위기 시기: [특정 년도와 이유]
-- 기회 시기: [특정 년도와 이유]
-
-**향후 20년 (20XX~20XX)**
-[간략히 큰 흐름만 제시]
-
-### 📔 5) 분야별 상세 분석
-
-**5-1. 재물운**
-- 재성 상태: [편재/정재 유무, 강약]
-- 재물 획득 방식: [노동소득/투자/상속 등]
-- 재물운 최고점: [몇 세 전후]
-- 주의사항: [재물 손실 위험 시기]
-
-**5-2. 직업/사업운**
-- 적성 직업: [용신 오행 기준 추천]
-- 관성 분석: [직장 안정성]
-- 창업 적합도: [식상/재성 조합 판단]
-- 리더십 여부: [양인, 편관 등]
-
-**5-3. 건강운**
-- 취약 장기: [오행 편중에 따른 장기]
-- 주의 질병: [구체적 질병명]
-- 위험 시기: [대운/세운 조합]
-
-**5-4. 인연/배우자운**
-- 배우자성 위치: [남성은 재성, 여성은 관성]
-- 배우자 성향: [오행으로 유추]
-- 결혼 적기: [합 운이 오는 시기]
-- 이별 위험: [충/형 시기]
-
-**5-5. 자녀운**
-- 식상 상태: [자녀궁 강약]
-- 자녀 덕: [있음/없음]
-- 자녀 수: [식상 개수 참고]
-
-### 📓 6) 마스터 솔루션
-
-**6-1. 용신 개운법**
-- 직업: [용신 오행 관련 직업]
-- 방위: [길방/흉방]
-- 색상: [선호색/기피색]
-- 숫자: [길수/흉수]
-- 이름: [용신 오행을 넣은 개명 제안]
-
-**6-2. 시기별 행동 지침**
-- 喜運 시기: [공격적 확장 전략]
-- 忌運 시기: [방어적 보존 전략]
-
----
-
-## Part 2: 상담원용 고객 리딩 스크립트 (구어체)
-
-[상담원이 내담자에게 실제로 말하는 대본]
-
-"안녕하세요, {name}님. 사주를 깊이 있게 분석해보았습니다.
-
-**먼저 님의 타고난 그릇을 말씀드리면요...**
-
-[Part 1의 내용을 쉬운 말로 풀어서 설명]
-- 전문용어 → 일상 언어 변환
-- "갑목일간" → "나무 기운을 타고나신 분"
-- "식신생재격" → "재능으로 돈을 버는 구조"
-
-**님이 지나온 인생을 보면...**
-
-[과거 대운을 구어체로 풀이]
-- "4세부터 13세까지는 ○○대운이었는데, 이 시기는..."
-- "그래서 아마 그때 ~~~한 일이 있으셨을 겁니다"
-- "14세부터 23세는..."
-
-**현재 님의 상황은...**
-
-[현재 대운 + 올해 운세를 실전 상담 톤으로]
-- "지금은 이런 운이라서..."
-- "그래서 요즘 이런 고민이 있으실 수 있어요"
-
-**앞으로 이렇게 하시면 됩니다...**
-
-[구체적 실행 가이드를 친절하게]
-- "내년부터는..."
-- "특히 조심하셔야 할 게..."
-- "반대로 기회가 오는 시기는..."
-
-**마지막으로 당부드릴 말씀은...**
-
-[용신 개운법을 쉽게 설명]
-- "님은 ○○ 기운이 필요하니까..."
-- "색깔은 이런 걸 자주 쓰시고..."
-- "직업은 이런 쪽이 잘 맞으세요"
-
-감사합니다."
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[최종 경고 - AI 시스템]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-1. 위 모든 분석 항목을 빠짐없이 포함할 것
-2. Part 1은 전문적이고 상세하게, Part 2는 친근하고 쉽게
-3. 추상적 표현 금지 - 구체적 시기와 사건 명시
-4. 날짜 관련 질문 시 제공된 DB 데이터만 사용, 재계산 절대 금지
-5. 최소 3000자 이상의 심층 분석 제공
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-                    """
+                    prompt_values = dict(
+                        name=name, gender=gender, current_age=current_age,
+                        saju=result['사주'], daewoon=result['대운'], yearly_data=yearly_data,
+                    )
 
                 # [MODE 2] ★★★ 강화된 2026년 병오년 운세 프롬프트
                 elif st.session_state['analysis_mode'] == "2026_fortune":
-                    yearly_flow = get_yearly_detailed_flow(2026)
+                    yearly_flow = cached_yearly_flow(2026)
                     day_stem = result['사주'][2][0]
                     day_branch = result['사주'][2][1]
-                    good_days, bad_days = find_best_worst_days_2026(day_stem, day_branch)
+                    good_days, bad_days = cached_best_worst_days(day_stem, day_branch, 2026)
                     
                     good_days_str = ", ".join(good_days) if good_days else "특이사항 없음"
                     bad_days_str = ", ".join(bad_days) if bad_days else "특이사항 없음"
 
-                    system_instruction = f"""
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[AI 시스템 역할 정의]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-당신은 40년 경력의 명리학 마스터로, 2026년 병오년(丙午年) 운세를 정밀 분석합니다.
-
-**핵심 원칙:**
-1. 만세력 계산 능력 없음 - 오직 시스템 제공 DB 데이터만 사용
-2. 길일/흉일은 시스템이 산출한 데이터만 사용, 재계산 금지
-3. 추상적 위로 배제, 냉철한 논리와 팩트 중심
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[내담자 기본 데이터]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-성명: {name} ({gender}, {current_age}세)
-사주 명식: {result['사주']}
-대운 흐름: {result['대운']}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[2026년 병오년 시스템 데이터]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-**월별 간지 흐름 (DB 조회):**
-{yearly_flow}
-
-**★ [시스템 정밀 산출] 길일 (귀인/육합):**
-{good_days_str}
-
-**★ [시스템 정밀 산출] 흉일 (충/형/해/공망):**
-{bad_days_str}
-
-⚠️ 위 길일/흉일은 DB 기반 정확한 데이터입니다. 재계산하지 마세요.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[분석 프로토콜]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-### 1. 2026년 병오년 기운 분석
-- 천간 丙: 양의 화(火) - 태양
-- 지지 午: 양의 화(火) - 정오의 불
-- 종합: 화(火) 극성기 → 열정, 경쟁, 소모, 드러남
-
-### 2. 내담자 원국과의 상호작용
-- 일간과 병오의 관계 (상생/상극)
-- 용신과의 관계 (희운/기운)
-- 대운과 세운의 삼합/삼형 여부
-
-### 3. 월별 상세 분석
-1월~12월 각각:
-- 월간지와 원국의 합충형해
-- 그 달의 주요 이슈
-- 길흉 판단
-
-### 4. 길일/흉일 활용 전략
-- 시스템 제공 길일에 할 일
-- 시스템 제공 흉일에 피할 일
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[출력 형식]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-## Part 1: 2026년 병오년 정밀 운세 보고서
-
-### 📘 1) 2026년 전체 운세 개관
-
-**1-1. 병오년 기운과 사주의 조화**
-- 병오(丙午)의 오행: [火 극성]
-- 일간과의 관계: [생/극/비/설 판단]
-- 종합 길흉: [상/중/하 등급 + 근거]
-
-**1-2. 현 대운과의 상호작용**
-- 현재 대운: [X세~X세, 간지]
-- 대운-세운 조합: [삼합/육합/충/형 등]
-- 시너지 효과: [좋음/나쁨]
-
-### 📗 2) 분야별 운세 (등급제)
-
-**💰 재물/금전운: [상/중/하]**
-- 근거: [재성과 병오의 관계]
-- 예상 흐름: [수입 증가/감소, 지출 패턴]
-- 전략: [투자/저축/보존]
-- 위험 시기: [특정 월 명시]
-
-**🏢 사업/직장운: [상/중/하]**
-- 근거: [관성, 식상과 병오의 관계]
-- 직장인: [승진, 이직, 갈등 여부]
-- 사업자: [확장, 축소, 유지]
-- 전략: [구체적 행동 지침]
-
-**❤️ 부부/연애운: [상/중/하]**
-- 근거: [배우자성과 병오의 관계]
-- 기혼: [부부 관계, 갈등 소지]
-- 미혼: [이성 만남, 결혼 가능성]
-- 주의사항: [도화살, 충 등]
-
-**💊 건강운: [상/중/하]**
-- 근거: [오행 편중과 병오]
-- 취약 부위: [화 극성 → 심장, 혈압 등]
-- 주의 질병: [구체적 병명]
-- 예방법: [식이, 운동, 검진]
-
-**📚 학업/시험운: [상/중/하]**
-- 근거: [인성, 식상과 병오]
-- 집중력: [좋음/나쁨]
-- 합격 가능성: [높음/낮음]
-
-**⚖️ 관재/송사: [상/중/하]**
-- 근거: [관살과 병오]
-- 소송 여부: [유리/불리]
-- 법적 문제: [조심/괜찮음]
-
-### 📙 3) 월별 상세 전략
-
-**1월 (X월주: 간지)**
-- 주요 이슈: [재물/건강/인간관계 중 핵심]
-- 길흉: [좋음/보통/나쁨]
-- 행동 지침: [해야 할 일 3가지]
-- 주의사항: [하지 말아야 할 일]
-
-[2월~12월도 동일한 형식으로]
-
-### 📕 4) ★ 길일/흉일 활용 가이드
-
-**길일 목록 및 활용법:**
-{good_days_str}
-
-위 날짜들은 천을귀인, 육합일입니다. 이 날에 적합한 일:
-- 중요한 계약 체결
-- 사업 개시, 개업
-- 이사, 입주
-- 중요한 만남, 면접
-- 투자 결정
-- 혼인 날짜
-
-**흉일 목록 및 주의사항:**
-{bad_days_str}
-
-위 날짜들은 충, 형, 해, 공망일입니다. 이 날 피해야 할 일:
-- 중요한 계약 (분쟁 소지)
-- 큰 금액 거래
-- 수술, 시술
-- 여행 출발
-- 이사
-- 고위험 활동
-
-### 📔 5) 2026년 종합 전략
-
-**상반기 (1~6월) 전략:**
-- 핵심 키워드: [예: 확장 vs 보존]
-- 집중 분야: [재물/인연/건강 등]
-- 경계 사항: [구체적 리스크]
-
-**하반기 (7~12월) 전략:**
-- 핵심 키워드:
-- 집중 분야:
-- 경계 사항:
-
-**병오년 생존 전략 TOP 3:**
-1. [가장 중요한 전략]
-2. [두 번째 전략]
-3. [세 번째 전략]
-
----
-
-## Part 2: 고객 브리핑 스크립트
-
-"{name}님, 2026년 병오년 운세를 상세히 봤습니다.
-
-**먼저 전체적인 흐름부터 말씀드리면요...**
-
-[Part 1 내용을 쉽게 풀어서]
-- "내년은 불(火)의 기운이 아주 강한 해예요"
-- "님의 사주와는 이렇게 작용합니다..."
-
-**월별로 보면...**
-
-[1~12월을 구어체로]
-- "1월은 이러니까 이렇게 하세요"
-- "특히 조심하실 달은..."
-
-**중요한 날짜들도 알려드릴게요...**
-
-[길일/흉일을 쉽게 설명]
-- "이 날짜들은 귀인이 오는 날이니 중요한 일 잡으시고요"
-- "반대로 이 날들은 충이 있으니 조심하세요"
-
-**마지막으로...**
-
-2026년 잘 보내시려면 이 3가지만 기억하세요:
-1. [쉬운 말로]
-2. [쉬운 말로]
-3. [쉬운 말로]
-
-화이팅하세요!"
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[최종 경고]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-1. 시스템 제공 길일/흉일 데이터를 절대 재계산하지 말 것
-2. Part 1은 전문적으로, Part 2는 친근하게
-3. 최소 2500자 이상 작성
-4. 모든 월(1~12월) 빠짐없이 분석
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-                    """
-
-                with st.spinner("마스터가 데이터를 분석하고 보고서를 작성 중입니다..."):
-                    try:
-                        r = requests.post(url, headers=headers, json={"contents": [{"parts": [{"text": system_instruction}]}]})
-                        st.session_state['lifetime_script'] = r.json()['candidates'][0]['content']['parts'][0]['text']
-                    except Exception as e: st.error(f"분석 시스템 오류: {e}")
+                    prompt_values = dict(
+                        name=name, gender=gender, current_age=current_age,
+                        saju=result['사주'], daewoon=result['대운'], yearly_flow=yearly_flow,
+                        good_days_str=good_days_str, bad_days_str=bad_days_str,
+                    )
+
+                # 고정 지침(템플릿) 뒤에 내담자 데이터를 붙여 프롬프트 완성, 측정치는 세션에 보관
+                report_template = REPORT_TEMPLATES[st.session_state['analysis_mode']]
+                system_instruction, st.session_state['prompt_metrics'] = report_template.render(**prompt_values)
+
+                # 같은 원국/모드/모델/템플릿 버전 + 같은 내담자 데이터(성명, 나이, 금년 데이터 등)로 만든 보고서가 있으면 Gemini 호출 없이 재사용
+                report_key = make_report_key(result, st.session_state['analysis_mode'], gemini.model, report_template.version, **prompt_values)
+                cached_report = get_cached_report(report_key)
+                if cached_report:
+                    st.session_state['lifetime_script'] = cached_report
+                else:
+                    # 보고서는 백그라운드 작업으로 생성 (스크립트는 막히지 않고 진행 상황만 주기적으로 읽음)
+                    # 같은 보고서 키로 진행 중인 작업이 있으면 이어서 봄 → rerun / 새로고침 / 재접속 후에도 다시 요청하지 않음
+                    job = report_queue().get(st.session_state.get('report_job'))
+                    if job is None or job['cache_key'] != report_key:
+                        try:
+                            job_id = report_queue().submit(
+                                st.session_state['user_id'], report_key, st.session_state['analysis_mode'], gemini.model, report_template.version,
+                                partial(gemini.stream_generate, system_instruction, timeout=REPORT_TIMEOUT),
+                                label=name, chart=" ".join(result['사주']),
+                            )
+                            st.session_state['report_job'] = job_id
+                            job = report_queue().get(job_id)
+                        except JobLimitError as e: st.warning(str(e))
+                        except Exception as e: st.error(f"분석 시스템 오류: {e}")
+                    if job and job['status'] == "done":
+                        st.session_state['lifetime_script'] = job['report']
+                    elif job and job['status'] == "error":
+                        st.error(f"분석 시스템 오류: {job['error']}")
+                        if st.button("🔄 보고서 다시 요청"):
+                            st.session_state.pop('report_job', None)
+                            st.rerun()
+                    elif job:
+                        report_job_progress(job['job_id'])
 
             if 'lifetime_script' in st.session_state:
                 st.markdown(st.session_state['lifetime_script'])
@@ -856,7 +484,7 @@ else:
                     cur_date_str = now.strftime("%Y년 %m월 %d일")
                     
                     # '오늘'의 간지 데이터 강제 조회
-                    today_row = get_db_data(now.year, now.month, now.day, False)
+                    today_row = cached_day_row(now.year, now.month, now.day)
                     today_ganji_info = ""
                     if today_row:
                         today_ganji_info = f"""
@@ -867,65 +495,44 @@ else:
                         """
 
                     # [변경 2] 타인(남편/자녀) 사주 자동 분석 + 날짜 질문 분석
-                    target_info = extract_and_analyze_target(prompt)
-                    query_ganji = get_db_ganji_for_query(prompt)
-                    
-                    chat_ctx = f"""
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[내담자(본인) 원국 데이터]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{st.session_state['lifetime_script']}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[시스템 DB 확정 데이터 (Fact)]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-{today_ganji_info}
-
-{query_ganji}
-
-{target_info}
-
-(위 데이터는 saju.db에서 조회한 확정된 사실입니다. AI는 절대 재계산하지 말고 이 데이터를 근거로 답변하세요.)
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[이전 대화 기록]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
+                    target_info, query_ganji = gather_chat_context(prompt)
                     
-                    for m in st.session_state['chat_history'][:-1]:
-                        chat_ctx += f"{m['role']}: {m['content']}\n"
+                    # 고정 지침 뒤에 붙는 이번 질문의 데이터 (보고서/대화 기록 블록은 예산에 맞춰 아래에서 채움)
+                    chat_values = dict(today_ganji_info=today_ganji_info, query_ganji=query_ganji, target_info=target_info, question=prompt)
+
+                    # 토큰 예산 안에서 보고서는 질문 관련 부분만, 오래된 대화는 세션별 누적 요약으로 넣음
+                    report_block, history_block, ctx_metrics = fit_chat_context(
+                        st.session_state['lifetime_script'],
+                        st.session_state['chat_history'][:-1],
+                        prompt,
+                        fixed_tokens=CHAT_TEMPLATE.measure(report_block="", history_block="", **chat_values),
+                        state=st.session_state.setdefault('chat_summary', {}),
+                        summarize=summarize_chat_turns,
+                    )
+                    chat_ctx, ctx_metrics['prompt'] = CHAT_TEMPLATE.render(report_block=report_block, history_block=history_block, **chat_values)
+                    st.session_state['chat_ctx_metrics'] = ctx_metrics
                     
-                    chat_ctx += f"""
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[현재 질문]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{prompt}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[AI 시스템 응답 지침 - 위반 시 강제 종료]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-1. **DB 데이터 절대 우선**: 
-   - 질문에 "남편", "자녀", "19XX년" 등의 정보가 있고 위에 [⚡ 긴급: 제3자 사주 데이터]가 떴다면, 
-   - **절대로 "계산 기능이 없다"고 말하지 마십시오.**
-   - 이미 계산된 [사주 원국]과 [대운]이 제공되었으니 그것을 읽고 해석만 하십시오.
-
-2. **오늘/내일 운세**:
-   - 질문이 "오늘 어때?"라면 위에 제공된 [📅 오늘 날짜 기준 시스템 DB 데이터]를 보고 답하십시오.
-
-3. **구체적 분석**:
-   - 뜬구름 잡는 소리 금지. "금(金) 기운이 부족하니..." 처럼 제공된 오행 데이터를 근거로 드십시오.
+                    try:
+                        with st.chat_message("assistant"):
+                            ai_msg = st.write_stream(gemini.stream_generate(chat_ctx, timeout=CHAT_TIMEOUT))
+                        st.session_state['chat_history'].append({"role": "assistant", "content": ai_msg})
+                        st.rerun()
+                    except Exception as e: st.error(f"AI 응답 생성 실패: {e}")
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-                    
-                    with st.spinner("마스터가 DB를 조회하고 답변을 작성 중입니다..."):
-                        try:
-                            r = requests.post(url, headers=headers, json={"contents": [{"parts": [{"text": chat_ctx}]}]})
-                            ai_msg = r.json()['candidates'][0]['content']['parts'][0]['text']
-                            st.session_state['chat_history'].append({"role": "assistant", "content": ai_msg})
-                            with st.chat_message("assistant"): st.write(ai_msg)
-                            st.rerun()
-                        except Exception as e: st.error(f"AI 응답 생성 실패: {e}")
+# ==========================================
+# 캐시 / 재계산 현황 (이번 rerun 에서 실제로 계산한 항목)
+# ==========================================
+if st.session_state.get('logged_in'):
+    with st.sidebar.expander("🧮 캐시 / 재계산 현황"):
+        if RERUN_LOG: st.caption("이번 실행에서 다시 계산: " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in RERUN_LOG))
+        else: st.caption("이번 실행은 모두 캐시에서 읽었습니다.")
+        st.json({
+            "누적 재계산 (서버 프로세스)": dict(recompute_totals()),
+            "analyze_user LRU": analyze_cache_stats(),
+            "길일 캐시": lucky_day_cache_stats(),
+            "보고서 캐시": report_cache_stats(),
+            "채팅 날짜 해석 (로컬 처리율)": date_parser_stats(),
+            "제3자 생년월일 추출 (로컬 처리율)": birth_extractor_stats(),
+            "보고서 작업": report_queue().stats(),
+            "내 최근 보고서 작업": [f"{job['label']} / {job['analysis_mode']} / {job['status']}" for job in report_queue().recent(st.session_state.get('user_id'))],
+        }, expanded=False)
@@ -0,0 +1,154 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import saju_core
+
+# =========================================================
+# 야간 배치용 대량 사주 산출 CLI (saju_core 만 사용 → streamlit / pandas 를 불러오지 않음)
+# =========================================================
+# 사용법
+#   python batch_saju.py clients.csv -o result.jsonl
+#   python batch_saju.py clients.jsonl -o result.csv --workers 8 --db /data/saju.db
+#
+# 입력 CSV 헤더 / JSONL 키: date, hour, lunar, gender (선택: leap, 그 외 컬럼은 그대로 출력에 복사)
+# 잘못된 줄(JSON 오류, 객체가 아닌 값)이나 해석할 수 없는 레코드는 error 컬럼에 사유(줄 번호 포함)를 적어 출력하고 계속 진행합니다.
+# 입력은 chunk 단위로 읽고, 처리 중인 chunk 수를 workers*2 로 제한하므로 파일 크기와 상관없이 메모리가 일정합니다.
+
+OUTPUT_COLUMNS = saju_core.ANALYZE_MANY_COLUMNS
+
+# 읽을 수 없는 입력 줄 (JSON 오류, 객체가 아닌 값) - 배치를 멈추지 않고 error 가 채워진 행으로 출력
+BadRecord = namedtuple("BadRecord", ["line", "message"])
+
+def _init_worker(db_path):
+    # 워커마다 만세력 인덱스를 읽기 전용으로 한 번 올림
+    saju_core.load_calendar_index(db_path)
+
+def _error_row(message):
+    row = dict.fromkeys(OUTPUT_COLUMNS)
+    row["error"] = message
+    return row
+
+def _analyze_chunk(records):
+    # 레코드 단위로 오류를 행에 담음 (한 건 때문에 chunk 전체 결과가 사라지지 않도록)
+    out = []
+    for record in records:
+        if isinstance(record, BadRecord):
+            out.append(_error_row(f"{record.line}행: {record.message}"))
+        elif not isinstance(record, dict):
+            out.append(_error_row(f"입력 형식 오류: 객체가 아닌 레코드 ({type(record).__name__})"))
+        else:
+            row = dict(record)
+            row.update(saju_core.analyze_record(record))
+            out.append(row)
+    return out
+
+def read_records(path, fmt):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line: continue
+                try: record = json.loads(line)
+                except ValueError as e:
+                    yield BadRecord(number, f"JSON 형식 오류: {e}")
+                    continue
+                yield record if isinstance(record, dict) else BadRecord(number, f"입력 형식 오류: 객체가 아닌 값 ({type(record).__name__})")
+
+def iter_chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+class ResultWriter:
+    def __init__(self, f, fmt):
+        self.f = f
+        self.fmt = fmt
+        self.csv = None
+
+    def write(self, rows):
+        for row in rows:
+            if self.fmt == "jsonl":
+                self.f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+                continue
+            if self.csv is None:
+                # 헤더는 첫 행의 입력 컬럼 + 결과 컬럼
+                fields = [k for k in row if k not in OUTPUT_COLUMNS] + OUTPUT_COLUMNS
+                self.csv = csv.DictWriter(self.f, fieldnames=fields, extrasaction="ignore")
+                self.csv.writeheader()
+            if isinstance(row.get("daewoon"), list): row["daewoon"] = " ".join(row["daewoon"])
+            self.csv.writerow(row)
+        self.f.flush()
+
+def _detect_format(path, fmt):
+    if fmt: return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def run(args):
+    in_fmt = _detect_format(args.input, args.input_format)
+    out_fmt = _detect_format(args.output or "", args.output_format) if args.output else (args.output_format or "jsonl")
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    writer = ResultWriter(out, out_fmt)
+
+    done = errors = 0
+    started = last_report = time.time()
+
+    def report(final=False):
+        elapsed = max(time.time() - started, 1e-9)
+        label = "완료" if final else "진행"
+        print(f"[{label}] {done:,}건 처리 (오류 {errors:,}건) / {elapsed:.1f}초 / {done / elapsed:,.0f}건/초", file=sys.stderr)
+
+    def consume(rows):
+        nonlocal done, errors, last_report
+        writer.write(rows)
+        done += len(rows)
+        errors += sum(1 for r in rows if r.get("error"))
+        if time.time() - last_report >= args.progress_every:
+            last_report = time.time()
+            report()
+
+    try:
+        chunks = iter_chunks(read_records(args.input, in_fmt), args.chunk_size)
+        if args.workers <= 1:
+            _init_worker(args.db)
+            for chunk in chunks: consume(_analyze_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.db,)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_analyze_chunk, chunk))
+                    # 입력 순서대로 출력하면서 대기 중인 chunk 수를 제한
+                    while len(pending) >= args.workers * 2:
+                        consume(pending.popleft().result())
+                while pending:
+                    consume(pending.popleft().result())
+    finally:
+        if out is not sys.stdout: out.close()
+    report(final=True)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="생년월일 CSV/JSONL 을 읽어 사주 원국/대운/자미두수를 일괄 산출합니다.")
+    parser.add_argument("input", help="입력 파일 (.csv 또는 .jsonl)")
+    parser.add_argument("-o", "--output", help="출력 파일 (.jsonl 또는 .csv, 생략 시 표준출력 JSONL)")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"])
+    parser.add_argument("--output-format", choices=["csv", "jsonl"])
+    parser.add_argument("--db", default=saju_core.CALENDAR_DB_PATH, help="만세력 DB 경로 (읽기 전용으로 엶) 또는 export-calendar 로 만든 만세력 파일 (mmap)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="프로세스 수 (1 이면 단일 프로세스)")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--progress-every", type=float, default=5.0, help="진행 상황 출력 간격(초)")
+    return run(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
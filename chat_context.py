@@ -0,0 +1,124 @@
+import re
+
+# =========================================================
+# 채팅 프롬프트 크기 관리 (토큰 예산 + 이전 대화 누적 요약 + 보고서 관련 부분만 발췌)
+# =========================================================
+CHAT_TOKEN_BUDGET = 12000   # 채팅 1회 요청의 목표 토큰 수 (추정치 기준)
+HISTORY_SHARE = 0.35        # 고정 블록을 뺀 나머지 중 대화 기록에 쓸 비율
+RECENT_MESSAGES = 6         # 요약하지 않고 그대로 넣을 최근 메시지 수
+MIN_AVAILABLE = 2000        # 고정 블록이 커도 보고서/기록에 최소한 남겨 둘 토큰
+
+# 질문 주제 → 보고서에서 찾을 단어
+TOPIC_KEYWORDS = {
+    '재물': ['재물', '금전', '돈', '투자', '재성', '수입', '부동산', '매매'],
+    '직업': ['직업', '사업', '직장', '이직', '승진', '창업', '관성', '조직', '리더십'],
+    '건강': ['건강', '질병', '장기', '수술', '체질'],
+    '인연': ['인연', '배우자', '결혼', '연애', '궁합', '부부', '남편', '아내', '이별'],
+    '자녀': ['자녀', '아들', '딸', '자식', '식상'],
+    '학업': ['학업', '시험', '진로', '공부', '합격', '적성'],
+    '관재': ['관재', '송사', '소송', '법적'],
+    '이동': ['이동', '이사', '변동', '여행', '역마'],
+    '시기': ['대운', '세운', '월별', '올해', '내년', '앞으로', '미래', '과거', '시기', '언제'],
+}
+
+_HEADING_RE = re.compile(r'^#{1,6}\s', re.M)
+_WORD_RE = re.compile(r'[가-힣A-Za-z一-龥]{2,}')
+
+def estimate_tokens(text):
+    # 토크나이저 없이 쓰는 근사치: UTF-8 4바이트 ≈ 1토큰 (한글 1자 ≈ 0.75토큰)
+    return (len(text.encode("utf-8")) + 3) // 4
+
+def split_sections(report):
+    # 마크다운 제목(#) 단위로 나눔. 첫 제목 앞의 머리말도 하나의 구역
+    starts = [m.start() for m in _HEADING_RE.finditer(report)]
+    if not starts or starts[0] != 0: starts = [0] + starts
+    return [report[a:b].strip() for a, b in zip(starts, starts[1:] + [len(report)]) if report[a:b].strip()]
+
+def _section_score(section, question):
+    words = set(_WORD_RE.findall(question))
+    score = sum(section.count(w) for w in words)
+    for topic, keywords in TOPIC_KEYWORDS.items():
+        if topic in question or any(k in question for k in keywords):
+            score += sum(section.count(k) for k in keywords)
+    return score
+
+def select_report_sections(report, question, budget_tokens):
+    """보고서 전체가 예산 안에 들어가면 그대로, 넘으면 첫 구역(원국 요약) + 질문과 관련 높은 구역 순으로 발췌"""
+    if estimate_tokens(report) <= budget_tokens: return report
+    sections = split_sections(report)
+    if not sections: return ""
+    chosen, used = {0}, estimate_tokens(sections[0])
+    ranked = sorted(range(1, len(sections)), key=lambda i: _section_score(sections[i], question), reverse=True)
+    for i in ranked:
+        cost = estimate_tokens(sections[i])
+        if used + cost > budget_tokens: continue
+        chosen.add(i)
+        used += cost
+    text = "\n\n".join(sections[i] for i in sorted(chosen))
+    if used > budget_tokens:
+        # 첫 구역만으로도 넘치면 앞부분만 자름
+        text = _truncate_tokens(text, budget_tokens)
+    return text + "\n\n(※ 보고서 중 질문과 관련된 부분만 발췌)"
+
+def _truncate_tokens(text, budget_tokens, keep="head"):
+    data = text.encode("utf-8")
+    limit = max(budget_tokens, 0) * 4
+    if len(data) <= limit: return text
+    cut = data[:limit] if keep == "head" else data[-limit:]
+    return cut.decode("utf-8", errors="ignore")
+
+def _format_turns(turns, limit=None):
+    lines = []
+    for m in turns:
+        content = m['content'] if limit is None or len(m['content']) <= limit else m['content'][:limit] + "…"
+        lines.append(f"{m['role']}: {content}")
+    return "\n".join(lines)
+
+def _update_summary(state, older, summarize):
+    # state: {"upto": 요약에 반영된 메시지 수, "text": 누적 요약} - 세션마다 보관해서 재사용
+    if state.get("upto", 0) > len(older): state.clear()  # 대화가 새로 시작됨
+    upto = state.get("upto", 0)
+    if upto == len(older): return state.get("text", "")
+    new_turns = older[upto:]
+    summary = None
+    if summarize:
+        try: summary = summarize(state.get("text", ""), new_turns)
+        except Exception: summary = None
+    if not summary:
+        # 요약 호출이 실패하면 메시지를 짧게 잘라 이어 붙임
+        summary = "\n".join(filter(None, [state.get("text", ""), _format_turns(new_turns, limit=150)]))
+    state["upto"], state["text"] = len(older), summary
+    return summary
+
+def build_history_block(history, state, summarize=None, budget_tokens=4000):
+    """대화 전체가 예산 안에 들어가면 원문 그대로, 넘으면 오래된 대화는 누적 요약으로, 최근 RECENT_MESSAGES 개는 원문으로 넣습니다."""
+    full_text = _format_turns(history)
+    # 예산 안이면 요약 호출(응답 전에 막히는 Gemini 호출)을 하지 않음
+    if estimate_tokens(full_text) <= budget_tokens: return full_text
+    split = max(len(history) - RECENT_MESSAGES, 0)
+    older, recent = history[:split], history[split:]
+    summary = _update_summary(state, older, summarize) if older else ""
+    recent_text = _format_turns(recent)
+    if estimate_tokens(recent_text) > budget_tokens * 0.7:
+        recent_text = _truncate_tokens(_format_turns(recent, limit=600), int(budget_tokens * 0.7), keep="tail")
+    summary_budget = budget_tokens - estimate_tokens(recent_text)
+    parts = []
+    if summary: parts.append("[이전 대화 요약]\n" + _truncate_tokens(summary, summary_budget, keep="tail"))
+    if recent_text: parts.append(recent_text)
+    return "\n\n".join(parts)
+
+def fit_chat_context(report, history, question, fixed_tokens, state, summarize=None, budget=CHAT_TOKEN_BUDGET):
+    """고정 블록(지침, DB 데이터, 현재 질문)을 뺀 예산 안에서 보고서 발췌와 대화 기록을 만듭니다.
+    반환: (보고서 블록, 대화 기록 블록, 측정치 dict)"""
+    available = max(budget - fixed_tokens, MIN_AVAILABLE)
+    history_text = build_history_block(history, state, summarize, int(available * HISTORY_SHARE))
+    report_text = select_report_sections(report, question, available - estimate_tokens(history_text))
+    metrics = {
+        "budget": budget,
+        "fixed_tokens": fixed_tokens,
+        "report_tokens": estimate_tokens(report_text),
+        "history_tokens": estimate_tokens(history_text),
+        "summarized_messages": state.get("upto", 0),
+    }
+    metrics["total_tokens"] = fixed_tokens + metrics["report_tokens"] + metrics["history_tokens"]
+    return report_text, history_text, metrics
@@ -0,0 +1,185 @@
+import re
+import threading
+from datetime import date, datetime, timedelta
+
+import pytz
+
+# =========================================================
+# 채팅 문장 로컬 해석기 (Gemini 호출 전에 흔한 패턴을 직접 처리)
+# =========================================================
+KST = pytz.timezone('Asia/Seoul')
+
+NO_DATE = "NO_DATE"  # 날짜 언급이 없다고 확신하는 경우 (None 은 판단 불가 → LLM 으로 넘김)
+
+RELATIVE_DAYS = {'오늘': 0, '금일': 0, '지금': 0, '내일': 1, '명일': 1, '모레': 2, '글피': 3, '어제': -1, '그제': -2, '그저께': -2}
+YEAR_WORDS = {'올해': 0, '금년': 0, '내년': 1, '명년': 1, '작년': -1, '지난해': -1}
+
+_RELATIVE_RE = re.compile('|'.join(sorted(RELATIVE_DAYS, key=len, reverse=True)))
+_AFTER_RE = re.compile(r'(\d{1,3})\s*일\s*(후|뒤|전)')
+_FULL_RE = re.compile(r'(\d{4})\s*년\s*(\d{1,2})\s*월\s*(\d{1,2})\s*일')
+_ISO_RE = re.compile(r'(?<!\d)(\d{4})[-./](\d{1,2})[-./](\d{1,2})(?!\d)')
+_MONTH_DAY_RE = re.compile(r'(?:(' + '|'.join(YEAR_WORDS) + r')\s*)?(?<!\d)(\d{1,2})\s*월\s*(\d{1,2})\s*일')
+_SLASH_RE = re.compile(r'(?<![\d/])(\d{1,2})/(\d{1,2})(?![\d/])')
+
+# 로컬 규칙으로 확정하기 어려운 표현 (요일, 주 단위, 명절, 음력, 생년월일 문맥 등) → LLM 이 판단
+_AMBIGUOUS_RE = re.compile(r'요일|주말|이번\s*주|다음\s*주|지난\s*주|다음\s*달|이번\s*달|지난\s*달|설날|추석|명절|음력|양력|생일|태어|출생|생년|년생|(?<!\d)\d{2}\s*년\s*\d')
+# 이 중 하나도 없으면 날짜 질문이 아니라고 봄
+_DATE_HINT_RE = re.compile(r'\d|' + '|'.join(RELATIVE_DAYS) + '|' + '|'.join(YEAR_WORDS) + r'|요일|주말|주간|(?:이번|다음|지난|다다음)\s*주|언제|날짜|며칠|몇\s*일|달|월|설날|추석|명절|생일')
+
+_STATS = {"local": 0, "no_date": 0, "fallback": 0}
+_STATS_LOCK = threading.Lock()
+
+def _count(key):
+    with _STATS_LOCK: _STATS[key] += 1
+
+def date_parser_stats():
+    # local: 로컬에서 날짜 확정 / no_date: 날짜 없음 확정 / fallback: LLM 으로 넘김
+    with _STATS_LOCK: stats = dict(_STATS)
+    total = sum(stats.values())
+    stats["fast_path_ratio"] = (stats["local"] + stats["no_date"]) / total if total else 0.0
+    return stats
+
+def _safe_date(y, m, d):
+    try: return date(int(y), int(m), int(d))
+    except ValueError: return None
+
+def _candidates(text, today):
+    found = []
+    for m in _FULL_RE.finditer(text): found.append(_safe_date(*m.groups()))
+    for m in _ISO_RE.finditer(text): found.append(_safe_date(*m.groups()))
+    rest = _ISO_RE.sub(' ', _FULL_RE.sub(' ', text))
+    for m in _MONTH_DAY_RE.finditer(rest):
+        year = today.year + YEAR_WORDS.get(m.group(1) or '', 0)
+        found.append(_safe_date(year, m.group(2), m.group(3)))
+    for m in _SLASH_RE.finditer(rest): found.append(_safe_date(today.year, *m.groups()))
+    for m in _AFTER_RE.finditer(text):
+        n = int(m.group(1))
+        found.append(today + timedelta(days=-n if m.group(2) == '전' else n))
+    if not found:
+        for m in _RELATIVE_RE.finditer(text): found.append(today + timedelta(days=RELATIVE_DAYS[m.group(0)]))
+    return found
+
+def parse_query_date(text, now=None):
+    """채팅 질문에서 대상 날짜를 찾습니다 (KST 기준).
+    반환: date (확정) / NO_DATE (날짜 언급 없음) / None (판단 불가 → LLM 사용)"""
+    now = now or datetime.now(KST)
+    today = now.date() if isinstance(now, datetime) else now
+
+    if not _DATE_HINT_RE.search(text):
+        _count("no_date")
+        return NO_DATE
+    if _AMBIGUOUS_RE.search(text):
+        _count("fallback")
+        return None
+    found = _candidates(text, today)
+    # 서로 다른 날짜가 여러 개이거나, 날짜처럼 보이는데 해석이 안 되면 LLM 에 맡김
+    if None in found or len(set(found)) != 1:
+        _count("fallback")
+        return None
+    _count("local")
+    return found[0]
+
+# =========================================================
+# 제3자(남편/자녀 등) 생년월일 추출
+# =========================================================
+NOT_FOUND = "NOT_FOUND"  # 생년월일로 볼 만한 토큰이 전혀 없음
+
+RELATION_GENDER = {
+    '남편': '남성', '아들': '남성', '남친': '남성', '남자친구': '남성', '아버지': '남성', '아빠': '남성', '오빠': '남성', '형': '남성', '시아버지': '남성', '장인': '남성', '사위': '남성',
+    '아내': '여성', '부인': '여성', '와이프': '여성', '딸': '여성', '여친': '여성', '여자친구': '여성', '어머니': '여성', '엄마': '여성', '누나': '여성', '언니': '여성', '시어머니': '여성', '장모': '여성', '며느리': '여성',
+    '동생': None, '애인': None, '배우자': None, '친구': None, '상대방': None,
+}
+HOUR_BRANCHES = {'자시': 0, '축시': 2, '인시': 4, '묘시': 6, '진시': 8, '사시': 10, '오시': 12, '미시': 14, '신시': 16, '유시': 18, '술시': 20, '해시': 22}
+
+# 한 글자 관계어(형, 딸)는 성형/형살/딸기 같은 단어 안에서도 걸리므로, 앞뒤가 띄어져 있거나 조사가 붙은 경우만 인정
+_SINGLE_RELATION = r'(?<![가-힣])(?:{})(?=(?:이|은|는|을|를|의|도|과|와|님|이랑|한테|에게)?(?![가-힣]))'
+_RELATION_RE = re.compile('|'.join(
+    [w for w in sorted(RELATION_GENDER, key=len, reverse=True) if len(w) > 1]
+    + [_SINGLE_RELATION.format('|'.join(w for w in RELATION_GENDER if len(w) == 1))]
+))
+_BIRTH_HINT_RE = re.compile(r'(?<!\d)(\d{6}|\d{8})(?!\d)|\d\s*년|\d\s*월|\d{4}[-./]\d')
+_BIRTH_FULL_RE = re.compile(r'(?<!\d)(\d{4}|\d{2})\s*년\s*(?:윤\s*)?(\d{1,2})\s*월\s*(\d{1,2})\s*일?')
+_BIRTH_SEP_RE = re.compile(r'(?<!\d)(\d{4})[-./](\d{1,2})[-./](\d{1,2})(?!\d)')
+_BIRTH_DIGITS_RE = re.compile(r'(?<![\d./-])(\d{8}|\d{6})(?![\d./-])')
+_HOUR_RE = re.compile(r'(오전|오후|새벽|아침|낮|저녁|밤)?\s*(\d{1,2})\s*시(?!간)')
+_HOUR_BRANCH_RE = re.compile('|'.join(HOUR_BRANCHES))
+_LEAP_RE = re.compile(r'윤달|윤월|윤\s*\d{1,2}\s*월')
+# 날짜가 생년월일이라는 표시 (없으면 이사/이직 날짜 등일 수 있으므로 LLM 에 맡김)
+_BIRTH_CUE_RE = re.compile(r'생년|생일|생시|태어|출생|년생|[\d일]\s*생(?![가-힣])|(?<![\d./-])(?:\d{6}|\d{8})(?![\d./-])')
+
+_BIRTH_STATS = {"local": 0, "not_found": 0, "fallback": 0}
+
+def birth_extractor_stats():
+    # local: 로컬에서 확정 / not_found: 생년월일 없음 확정 / fallback: LLM 으로 넘김
+    with _STATS_LOCK: stats = dict(_BIRTH_STATS)
+    total = sum(stats.values())
+    stats["fast_path_ratio"] = (stats["local"] + stats["not_found"]) / total if total else 0.0
+    return stats
+
+def _count_birth(key):
+    with _STATS_LOCK: _BIRTH_STATS[key] += 1
+
+def _full_year(y, this_year):
+    # 2자리 연도: 올해 이하면 20xx, 아니면 19xx (예: 73 → 1973)
+    y = int(y)
+    if y >= 100: return y
+    return 2000 + y if y <= this_year % 100 else 1900 + y
+
+def _birth_dates(text, this_year):
+    found = []
+    for m in _BIRTH_FULL_RE.finditer(text): found.append((_full_year(m.group(1), this_year), int(m.group(2)), int(m.group(3))))
+    for m in _BIRTH_SEP_RE.finditer(text): found.append((int(m.group(1)), int(m.group(2)), int(m.group(3))))
+    for m in _BIRTH_DIGITS_RE.finditer(text):
+        digits = m.group(1)
+        y = int(digits[:4]) if len(digits) == 8 else _full_year(digits[:2], this_year)
+        found.append((y, int(digits[-4:-2]), int(digits[-2:])))
+    return found
+
+def _birth_hour(text):
+    hours = []
+    for m in _HOUR_RE.finditer(text):
+        period, h = m.group(1), int(m.group(2))
+        if h > 24: continue
+        if h == 12:
+            # 오전/새벽/밤/저녁 12시는 자정, 오후/낮 12시(또는 그냥 12시)는 정오
+            if period in ('오전', '새벽', '저녁', '밤'): h = 0
+        elif period in ('오후', '저녁') and h < 12: h += 12
+        elif period == '밤' and 7 <= h < 12: h += 12   # 밤 9시 → 21시, 밤 1시 → 1시
+        elif period == '낮' and 1 <= h <= 6: h += 12   # 낮 2시 → 14시
+        if period in ('밤', None) and h == 24: h = 0
+        hours.append(h % 24)
+    for m in _HOUR_BRANCH_RE.finditer(text): hours.append(HOUR_BRANCHES[m.group(0)])
+    if len(set(hours)) > 1: return None
+    return hours[0] if hours else 0
+
+def extract_birth_info(text, now=None):
+    """제3자 생년월일을 로컬 규칙으로 추출합니다.
+    반환: dict (확정, extract_and_analyze_target 의 LLM JSON 과 같은 키) / NOT_FOUND / None (판단 불가 → LLM)"""
+    now = now or datetime.now(KST)
+    today = now.date() if isinstance(now, datetime) else now
+    if not _BIRTH_HINT_RE.search(text):
+        _count_birth("not_found")
+        return NOT_FOUND
+
+    relations = set(_RELATION_RE.findall(text))
+    dates = set(_birth_dates(text, today.year))
+    hour = _birth_hour(text)
+    # 생년월일 표시가 있고, 대상이 하나, 날짜가 하나, 시간이 모순 없을 때만 확정
+    if not _BIRTH_CUE_RE.search(text) or len(relations) != 1 or len(dates) != 1 or hour is None:
+        _count_birth("fallback")
+        return None
+    relation = relations.pop()
+    y, m, d = dates.pop()
+    # 관계어에 성별이 있으면 그대로 (남편 … 여자 문제 → 남성), 동생/친구처럼 없을 때만 본문의 남자/여자로 판단
+    gender = RELATION_GENDER[relation]
+    if gender is None: gender = '여성' if re.search(r'여자|여성', text) else '남성' if re.search(r'남자|남성', text) else None
+    is_lunar = '음력' in text
+    # 음력은 30일까지, 양력은 실제 달력에 있는 날짜만, 오늘 이후 날짜는 생년월일이 아님
+    valid = (1 <= m <= 12 and 1 <= d <= 30) if is_lunar else _safe_date(y, m, d) is not None
+    valid = valid and (y, m, d) <= (today.year, today.month, today.day)
+    if gender is None or not valid:
+        _count_birth("fallback")
+        return None
+
+    _count_birth("local")
+    return {"found": True, "relation": relation, "year": y, "month": m, "day": d, "hour": hour, "lunar": is_lunar, "leap": is_lunar and bool(_LEAP_RE.search(text)), "gender": gender}
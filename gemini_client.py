@@ -0,0 +1,121 @@
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# =========================================================
+# Gemini API 공용 클라이언트
+# - requests.Session 하나로 연결 재사용 (keep-alive, TLS 핸드셰이크 1회)
+# - 호출마다 전체 마감 시간(timeout 초) 적용 → 응답 없는 소켓에 매달리지 않음
+# - 429 / 5xx 는 지터를 섞은 지수 백오프로 제한된 횟수만 재시도
+# =========================================================
+API_BASE = "https://generativelanguage.googleapis.com/v1beta/models"
+DEFAULT_MODEL = "gemini-2.0-flash"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+CONNECT_TIMEOUT = 5  # 초
+
+class GeminiError(Exception):
+    pass
+
+def extract_text(data):
+    # generateContent 응답 JSON → 본문 텍스트
+    try:
+        return "".join(part.get("text", "") for part in data["candidates"][0]["content"]["parts"])
+    except (KeyError, IndexError, TypeError):
+        message = data.get("error", {}).get("message") if isinstance(data, dict) else None
+        raise GeminiError(message or f"예상하지 못한 응답 형식: {str(data)[:200]}")
+
+def parse_json_text(text):
+    # 모델이 ```json 코드블록으로 감싸서 돌려주는 경우까지 처리
+    return json.loads(text.replace("```json", "").replace("```", "").strip())
+
+class GeminiClient:
+    def __init__(self, api_key, model=DEFAULT_MODEL, timeout=60, max_retries=3, backoff_base=0.5, backoff_max=8.0, pool_size=20):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+    def url(self, method="generateContent", model=None):
+        url = f"{API_BASE}/{model or self.model}:{method}?key={self.api_key}"
+        # 스트리밍은 SSE(data: {...}) 형식으로 받음
+        return url + "&alt=sse" if method == "streamGenerateContent" else url
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, payload, method="generateContent", timeout=None, stream=False, model=None):
+        """마감 시간(timeout 초) 안에서 재시도하며 POST. 성공한 requests.Response 를 돌려줍니다."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            response = None
+            try:
+                response = self.session.post(self.url(method, model), json=payload, timeout=(min(CONNECT_TIMEOUT, remaining), remaining), stream=stream)
+                if response.status_code not in RETRY_STATUS:
+                    if response.status_code >= 400:
+                        raise GeminiError(f"HTTP {response.status_code}: {response.text[:200]}")
+                    return response
+                last_error = GeminiError(f"HTTP {response.status_code}")
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+            if attempt == self.max_retries: break
+            delay = self._backoff(attempt, response)
+            if time.monotonic() + delay >= deadline: break
+            time.sleep(delay)
+        raise GeminiError(f"Gemini 호출 실패: {last_error or '마감 시간 초과'}")
+
+    def generate(self, prompt, timeout=None):
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        return extract_text(self.post(payload, timeout=timeout).json())
+
+    def stream_generate(self, prompt, timeout=None):
+        """streamGenerateContent 로 받은 텍스트 조각을 도착하는 대로 yield 합니다.
+        재시도는 첫 바이트를 받기 전까지만 하고, 마감 시간(timeout 초)은 스트림 전체에 적용합니다."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        response = self.post(payload, method="streamGenerateContent", timeout=timeout, stream=True)
+        try:
+            # 바이트 단위로 줄을 나눈 뒤 UTF-8 로 디코딩 (한글이 청크 경계에서 잘리지 않도록), chunk_size=None 은 받은 만큼 바로 넘겨줌
+            for raw in response.iter_lines(chunk_size=None):
+                if time.monotonic() > deadline: raise GeminiError("스트리밍 응답 마감 시간 초과")
+                line = raw.decode("utf-8")
+                if not line.startswith("data:"): continue
+                data = json.loads(line[5:].strip())
+                if not data.get("candidates"): continue  # 사용량 정보 등 본문 없는 조각
+                text = extract_text(data)
+                if text: yield text
+        except requests.RequestException as e:
+            raise GeminiError(f"스트리밍 중 연결 오류: {e}")
+        finally:
+            response.close()
+
+    def generate_json(self, prompt, timeout=None):
+        return parse_json_text(self.generate(prompt, timeout=timeout))
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def get_client(api_key, model=DEFAULT_MODEL):
+    # 프로세스 전체에서 (키, 모델)당 클라이언트 하나를 공유
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get((api_key, model))
+        if client is None:
+            client = _CLIENTS[(api_key, model)] = GeminiClient(api_key, model)
+        return client
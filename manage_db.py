@@ -1,50 +1,139 @@
+import argparse
+import os
 import sqlite3
+import subprocess
+import sys
 
-def init_system_db():
-    conn = sqlite3.connect('saju.db')
-    cursor = conn.cursor()
-    
-    # 1. 상담원(Users) 테이블 생성
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        username TEXT PRIMARY KEY,
-        password TEXT NOT NULL,
-        name TEXT
-    )
-    ''')
-    
-    # 2. 상담 기록(Consultations) 테이블 생성
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS consultations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        counselor_id TEXT,
-        client_name TEXT,
-        client_gender TEXT,
-        birth_date TEXT,
-        birth_time TEXT,
-        consult_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        memo TEXT,
-        FOREIGN KEY (counselor_id) REFERENCES users (username)
-    )
-    ''')
-    
-    # 3. 초기 상담원 데이터 삽입 (test1 ~ test5)
-    users = [
-        ('test1', '1234', '상담원1'),
-        ('test2', '1234', '상담원2'),
-        ('test3', '1234', '상담원3'),
-        ('test4', '1234', '상담원4'),
-        ('test5', '1234', '상담원5')
-    ]
-    
+import saju_core
+import saju_logic
+from saju_core import prepare_calendar_db, check_query_plans, export_calendar_file
+from saju_logic import MIGRATIONS, run_migrations, get_schema_version
+
+# 사용법
+#   python manage_db.py            → 운영 DB(saju_ops.db) 스키마 마이그레이션 적용 (migrate 와 동일, 기존 saju.db 의 계정/상담 기록 복사 포함)
+#   python manage_db.py status     → 현재 스키마 버전 / 미적용 마이그레이션 확인
+#   python manage_db.py seed       → 상담원 테스트 계정(test1~test5) 추가
+#   python manage_db.py prepare-calendar → 만세력(calenda_data) 커버링 인덱스 생성
+#   python manage_db.py export-calendar -o saju_calendar.bin → 만세력을 mmap 용 바이너리 파일로 컴파일 (원본은 계속 만세력 DB)
+#   python manage_db.py check-plans      → 만세력 조회 SQL 실행 계획 점검 (인덱스 없이 훑는 조회가 있으면 종료 코드 1)
+#   python manage_db.py bench-import     → saju_core / saju_logic import 시간 측정 (streamlit/pandas 를 불러오거나 기준 초과 시 종료 코드 1)
+#   --db 는 운영 DB, --calendar-db 는 만세력 DB (기본값은 환경변수 SAJU_OPS_DB / SAJU_CALENDAR_DB)
+
+def _connect_ops(path):
+    # 앱과 같은 설정(WAL 등)으로 운영 DB 를 엶
+    conn = sqlite3.connect(path)
+    for pragma in saju_logic.OPS_PRAGMAS: conn.execute(pragma)
+    return conn
+
+def cmd_migrate(args):
+    conn = _connect_ops(args.db)
+    try:
+        applied = run_migrations(conn)
+        if applied: print(f"마이그레이션 적용 완료: {applied} (현재 버전 {get_schema_version(conn)})")
+        else: print(f"이미 최신 스키마입니다. (버전 {get_schema_version(conn)})")
+    finally:
+        conn.close()
+
+def cmd_status(args):
+    conn = _connect_ops(args.db)
+    try:
+        current = get_schema_version(conn)
+        print(f"현재 스키마 버전: {current}")
+        for version, description, _ in MIGRATIONS:
+            mark = "적용됨" if version <= current else "미적용"
+            print(f"  [{mark}] {version}: {description}")
+    finally:
+        conn.close()
+
+def cmd_seed(args):
+    conn = _connect_ops(args.db)
+    try:
+        run_migrations(conn)
+        # 초기 상담원 데이터 삽입 (test1 ~ test5)
+        users = [
+            ('test1', '1234', '상담원1'),
+            ('test2', '1234', '상담원2'),
+            ('test3', '1234', '상담원3'),
+            ('test4', '1234', '상담원4'),
+            ('test5', '1234', '상담원5')
+        ]
+        cursor = conn.executemany('INSERT OR IGNORE INTO users (username, password, name) VALUES (?, ?, ?)', users)
+        conn.commit()
+        if cursor.rowcount: print(f"상담원 계정 {cursor.rowcount}개 생성 완료 (test1~test5 / 비번 1234)")
+        else: print("이미 계정이 존재합니다. 패스합니다.")
+    finally:
+        conn.close()
+
+def cmd_prepare_calendar(args):
+    conn = sqlite3.connect(args.calendar_db)
     try:
-        cursor.executemany('INSERT INTO users (username, password, name) VALUES (?, ?, ?)', users)
-        print("상담원 계정 생성 완료 (test1~test5 / 비번 1234)")
-    except sqlite3.IntegrityError:
-        print("이미 계정이 존재합니다. 패스합니다.")
-        
-    conn.commit()
-    conn.close()
+        prepare_calendar_db(conn)
+        print("만세력 커버링 인덱스 준비 완료")
+    finally:
+        conn.close()
+
+def cmd_check_plans(args):
+    conn = sqlite3.connect(args.calendar_db)
+    try:
+        problems = check_query_plans(conn)
+    finally:
+        conn.close()
+    if not problems:
+        print("모든 만세력 조회가 인덱스를 사용합니다.")
+        return 0
+    for name, detail in problems: print(f"  [인덱스 미사용] {name}: {detail}")
+    print("prepare-calendar 로 인덱스를 만들거나 조회 SQL 을 확인하세요.")
+    return 1
+
+def cmd_export_calendar(args):
+    conn = sqlite3.connect(args.calendar_db)
+    try:
+        days, size = export_calendar_file(conn, args.output)
+    finally:
+        conn.close()
+    print(f"만세력 파일 생성 완료: {args.output} ({days:,}일, {size / 1024:,.0f}KB)")
+
+HEAVY_MODULES = ("streamlit", "pandas", "numpy", "requests")
+_IMPORT_PROBE = (
+    "import sys, time; t = time.perf_counter(); import {module}; ms = (time.perf_counter() - t) * 1000; "
+    "print(ms, ','.join(m for m in {heavy!r} if m in sys.modules))"
+)
+
+def cmd_bench_import(args):
+    # 매번 새 프로세스에서 import 해 최솟값을 봄 (첫 실행의 디스크 캐시 영향 제외)
+    failed = False
+    for module in ("saju_core", "saju_logic"):
+        times, heavy = [], ""
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+            times.append(float(out[0]))
+            heavy = out[1] if len(out) > 1 else ""
+        best = min(times)
+        ok = best <= args.max_ms and not heavy
+        failed |= not ok
+        print(f"  [{'통과' if ok else '실패'}] import {module}: {best:.1f}ms (기준 {args.max_ms:.0f}ms)" + (f", 무거운 모듈 로드됨: {heavy}" if heavy else ""))
+    return 1 if failed else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="운영 DB / 만세력 DB 관리 도구")
+    parser.add_argument("--db", default=saju_logic.OPS_DB_PATH, help=f"운영 DB 파일 경로 (기본: {saju_logic.OPS_DB_PATH})")
+    parser.add_argument("--calendar-db", default=saju_core.CALENDAR_DB_PATH, help=f"만세력 DB 파일 경로 (기본: {saju_core.CALENDAR_DB_PATH})")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("migrate", help="스키마 마이그레이션 적용")
+    sub.add_parser("status", help="스키마 버전 확인")
+    sub.add_parser("seed", help="상담원 테스트 계정 추가")
+    sub.add_parser("prepare-calendar", help="만세력 커버링 인덱스 생성")
+    sub.add_parser("check-plans", help="만세력 조회 SQL 실행 계획 점검")
+    export = sub.add_parser("export-calendar", help="만세력을 컴파일된 바이너리 파일로 저장")
+    export.add_argument("-o", "--output", default="saju_calendar.bin", help="출력 파일 (기본: saju_calendar.bin)")
+    bench = sub.add_parser("bench-import", help="핵심 모듈 import 시간 측정")
+    bench.add_argument("--max-ms", type=float, default=150.0, help="허용하는 import 시간(ms)")
+    bench.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    saju_core.CALENDAR_DB_PATH = args.calendar_db  # 마이그레이션의 기존 데이터 복사 원본
+
+    commands = {"migrate": cmd_migrate, "status": cmd_status, "seed": cmd_seed, "prepare-calendar": cmd_prepare_calendar, "check-plans": cmd_check_plans, "export-calendar": cmd_export_calendar, "bench-import": cmd_bench_import}
+    return commands[args.command or "migrate"](args) or 0
 
 if __name__ == "__main__":
-    init_system_db()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from saju_logic import db_connection, ensure_schema, save_report
+
+# =========================================================
+# AI 보고서 백그라운드 작업 큐
+# - 보고서 생성(Gemini 스트리밍)을 Streamlit 스크립트 스레드가 아닌 제한된 워커 풀에서 실행
+# - 상태 / 스트리밍 중 부분 결과 / 최종 결과를 운영 DB(report_jobs)에 기록
+#   → rerun 이나 재접속 후에도 job_id 또는 같은 보고서 키로 다시 찾아서 이어 봄
+# - 동시 작업 한도: 전체(대기 + 실행 중) / 상담원별, 실제 동시 호출 수는 워커 수로 제한
+# =========================================================
+logger = logging.getLogger("saju")
+
+REPORT_WORKERS = int(os.environ.get("SAJU_REPORT_WORKERS", "4"))                        # 서버 프로세스당 동시에 Gemini 를 호출하는 작업 수
+REPORT_JOBS_MAX = int(os.environ.get("SAJU_REPORT_JOBS_MAX", "16"))                     # 전체 대기 + 실행 중 작업 한도 (운영 DB 공유 시 전 프로세스 합계)
+REPORT_JOBS_PER_COUNSELOR = int(os.environ.get("SAJU_REPORT_JOBS_PER_COUNSELOR", "2"))  # 상담원 한 명의 대기 + 실행 중 작업 한도
+PARTIAL_SAVE_INTERVAL = 1.0    # 초, 스트리밍 중 부분 결과를 DB 에 쓰는 간격
+STALE_AFTER = 900              # 초, 이 시간 동안 갱신이 없는 대기/실행 작업은 중단된 것으로 봄 (서버 재시작 등)
+JOB_RETENTION = 7 * 24 * 3600  # 초, 끝난 작업 기록 보관 기간
+
+ACTIVE_STATUSES = ("queued", "running")
+_ACTIVE_SQL = "status IN ('queued', 'running')"
+_JOB_COLUMNS = ("job_id", "counselor_id", "label", "chart", "analysis_mode", "model", "template_version", "cache_key",
+                "status", "partial", "report", "error", "created_at", "started_at", "finished_at", "updated_at")
+_KEY_RE = re.compile(r"key=[^&\s'\"]+")
+
+class JobLimitError(Exception):
+    pass
+
+def _error_message(e):
+    # 요청 URL 에 들어 있는 API 키는 DB 에 남기지 않음
+    return _KEY_RE.sub("key=***", str(e) or type(e).__name__)[:500]
+
+class ReportJobQueue:
+    """보고서 작업을 DB 에 기록하고 워커 풀에서 실행합니다.
+    generate 는 작업마다 넘기는 함수로, 호출하면 텍스트 조각을 yield 해야 합니다 (예: GeminiClient.stream_generate)."""
+
+    def __init__(self, workers=REPORT_WORKERS, max_jobs=REPORT_JOBS_MAX, per_counselor=REPORT_JOBS_PER_COUNSELOR):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.per_counselor = per_counselor
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-job")
+        self._lock = threading.Lock()
+        self._local_active = 0  # 이 프로세스에서 대기/실행 중인 작업 수
+
+    def submit(self, counselor_id, cache_key, analysis_mode, model, template_version, generate, label=None, chart=None):
+        """작업을 등록하고 job_id 를 돌려줍니다. 같은 보고서 키로 진행 중인 작업이 있으면 새로 만들지 않고 그 job_id 를 돌려줍니다.
+        한도를 넘으면 JobLimitError."""
+        ensure_schema()
+        now = time.time()
+        with db_connection() as conn:
+            # 한도 확인과 등록을 한 트랜잭션에서 (여러 세션/프로세스가 동시에 등록해도 한도를 넘지 않도록)
+            conn.execute("BEGIN IMMEDIATE")
+            self._expire_stale(conn, now)
+            row = conn.execute(f"SELECT job_id FROM report_jobs WHERE cache_key = ? AND {_ACTIVE_SQL} ORDER BY created_at DESC LIMIT 1", (cache_key,)).fetchone()
+            if row:
+                conn.commit()
+                return row[0]
+            mine = conn.execute(f"SELECT COUNT(*) FROM report_jobs WHERE counselor_id = ? AND {_ACTIVE_SQL}", (counselor_id,)).fetchone()[0]
+            if mine >= self.per_counselor:
+                raise JobLimitError(f"진행 중인 보고서가 {mine}건 있습니다. 끝난 뒤 다시 요청해 주세요. (상담원당 최대 {self.per_counselor}건)")
+            total = conn.execute(f"SELECT COUNT(*) FROM report_jobs WHERE {_ACTIVE_SQL}").fetchone()[0]
+            if total >= self.max_jobs:
+                raise JobLimitError(f"보고서 요청이 몰려 있습니다 (대기 {total}건). 잠시 후 다시 요청해 주세요.")
+            job_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO report_jobs (job_id, counselor_id, label, chart, analysis_mode, model, template_version, cache_key, status, created_at, updated_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                         (job_id, counselor_id, label, chart, analysis_mode, model, template_version, cache_key, now, now))
+            conn.execute("DELETE FROM report_jobs WHERE status IN ('done', 'error') AND updated_at < ?", (now - JOB_RETENTION,))
+            conn.commit()
+        with self._lock: self._local_active += 1
+        self._executor.submit(self._run, job_id, cache_key, analysis_mode, model, template_version, generate)
+        return job_id
+
+    def _run(self, job_id, cache_key, analysis_mode, model, template_version, generate):
+        parts = []
+        try:
+            self._update(job_id, status="running", started_at=time.time())
+            last_save = time.monotonic()
+            for chunk in generate():
+                parts.append(chunk)
+                if time.monotonic() - last_save >= PARTIAL_SAVE_INTERVAL:
+                    self._update(job_id, partial="".join(parts))
+                    last_save = time.monotonic()
+            report = "".join(parts)
+            if not report.strip(): raise RuntimeError("빈 응답을 받았습니다")
+            # 다른 세션도 Gemini 호출 없이 재사용하도록 보고서 캐시에 먼저 저장
+            save_report(cache_key, analysis_mode, model, template_version, report)
+            self._update(job_id, status="done", report=report, partial=None, finished_at=time.time())
+        except Exception as e:
+            logger.exception("보고서 작업 실패 (%s)", job_id)
+            try: self._update(job_id, status="error", error=_error_message(e), partial="".join(parts) or None, finished_at=time.time())
+            except Exception: logger.exception("보고서 작업 상태 기록 실패 (%s)", job_id)
+        finally:
+            with self._lock: self._local_active -= 1
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with db_connection() as conn:
+            conn.execute(f"UPDATE report_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+            conn.commit()
+
+    def _expire_stale(self, conn, now):
+        # 서버 재시작 등으로 워커가 사라진 작업은 오류로 정리 (한도 계산에서 빠지도록)
+        conn.execute(f"UPDATE report_jobs SET status = 'error', error = '작업이 중단되었습니다 (서버 재시작 등)', finished_at = ?, updated_at = ? WHERE {_ACTIVE_SQL} AND updated_at < ?",
+                     (now, now, now - STALE_AFTER))
+
+    def _fetch(self, sql, params):
+        ensure_schema()
+        with db_connection() as conn:
+            rows = conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM report_jobs WHERE {sql}", params).fetchall()
+        jobs = [dict(zip(_JOB_COLUMNS, row)) for row in rows]
+        now = time.time()
+        for job in jobs:
+            # 조회할 때는 쓰기 없이 표시만 중단으로 바꿈 (DB 정리는 다음 submit 때)
+            if job["status"] in ACTIVE_STATUSES and job["updated_at"] < now - STALE_AFTER:
+                job["status"], job["error"] = "error", "작업이 중단되었습니다 (서버 재시작 등)"
+        return jobs
+
+    def get(self, job_id):
+        # 없으면 None
+        if not job_id: return None
+        jobs = self._fetch("job_id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def recent(self, counselor_id, limit=5):
+        return self._fetch("counselor_id = ? ORDER BY created_at DESC LIMIT ?", (counselor_id, limit))
+
+    def stats(self):
+        ensure_schema()
+        with db_connection() as conn:
+            counts = dict(conn.execute(f"SELECT status, COUNT(*) FROM report_jobs WHERE {_ACTIVE_SQL} GROUP BY status").fetchall())
+        with self._lock: local = self._local_active
+        return {"workers": self.workers, "max_jobs": self.max_jobs, "per_counselor": self.per_counselor,
+                "queued": counts.get("queued", 0), "running": counts.get("running", 0), "local_active": local}
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,708 @@
+import sqlite3
+import os
+import time
+import logging
+import mmap
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from datetime import date
+from collections import OrderedDict
+from pathlib import Path
+
+# =========================================================
+# 사주 계산 핵심 모듈 (만세력 조회, 원국/대운/자미두수, 길일 산출, 대량 분석)
+# - streamlit / pandas 를 모듈 로드 시 불러오지 않음 → 배치 워커, 스크립트에서 가볍게 import
+# - 오류는 예외로 올리거나 logging("saju") 로 남기고, 화면 표시는 호출하는 쪽에서 처리
+# - 상담원/상담 기록/캐시 같은 운영 DB 기능은 saju_logic
+# =========================================================
+logger = logging.getLogger("saju")
+
+# 60갑자 리스트
+GANJI_60 = [
+    '甲子', '乙丑', '丙寅', '丁卯', '戊辰', '己巳', '庚午', '辛未', '壬申', '癸酉',
+    '甲戌', '乙亥', '丙子', '丁丑', '戊寅', '己卯', '庚辰', '辛巳', '壬午', '癸未',
+    '甲申', '乙酉', '丙戌', '丁亥', '戊子', '己丑', '庚寅', '辛卯', '壬辰', '癸巳',
+    '甲午', '乙未', '丙申', '丁酉', '戊戌', '己亥', '庚子', '辛丑', '壬寅', '癸卯',
+    '甲辰', '乙巳', '丙午', '丁未', '戊申', '己酉', '庚戌', '辛亥', '壬子', '癸丑',
+    '甲寅', '乙卯', '丙辰', '丁巳', '戊午', '己未', '庚申', '辛酉', '壬戌', '癸亥'
+]
+
+BRANCHES = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
+
+# 만세력 DB 는 읽기 전용(mode=ro, immutable=1)으로만 엶 (운영 DB 는 saju_logic.OPS_DB_PATH)
+CALENDAR_DB_PATH = os.environ.get("SAJU_CALENDAR_DB", "saju.db")
+CALENDAR_IMMUTABLE = os.environ.get("SAJU_CALENDAR_IMMUTABLE", "1") != "0"  # 운영 중 만세력 DB 를 직접 고친다면 0
+CALENDAR_MMAP_SIZE = 256 * 1024 * 1024
+
+def get_db_path():
+    # 만세력 DB 파일 경로 확인
+    if os.path.exists(CALENDAR_DB_PATH):
+        return CALENDAR_DB_PATH
+    else:
+        # 파일이 없으면 경고
+        return None
+
+# =========================================================
+# ★ 만세력(calenda_data) 조회 SQL / 커버링 인덱스 / 실행 계획 점검
+# =========================================================
+# 만세력 DB 에 실제로 실행하는 SQL (날짜별 조회는 모두 인메모리 CalendarIndex 로 처리하므로 시작 시 전체 읽기 한 번뿐)
+# 음력 연도 / 윤달을 날짜 순서로 유도하므로 양력 날짜 순으로 읽음. manage_db.py check-plans 와 tests 가 실행 계획을 검사함
+CALENDAR_QUERIES = {
+    "all": "SELECT cd_sy, cd_sm, cd_sd, cd_lm, cd_ld, cd_hyganjee, cd_kyganjee, cd_dyganjee FROM calenda_data ORDER BY cd_sy, cd_sm, cd_sd",
+}
+
+# 위 전체 읽기를 인덱스 순서 그대로 (임시 정렬 없이, 테이블을 다시 찾지 않고) 읽게 하는 커버링 인덱스
+CALENDAR_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_calenda_solar ON calenda_data (cd_sy, cd_sm, cd_sd, cd_lm, cd_ld, cd_hyganjee, cd_kyganjee, cd_dyganjee)",
+]
+# 예전 prepare-calendar 가 만들던, 쓰는 조회가 없는 인덱스 (DB 크기만 늘리므로 정리)
+OBSOLETE_CALENDAR_INDEXES = ["idx_calenda_lunar"]
+
+def prepare_calendar_db(conn):
+    """만세력 DB 에 커버링 인덱스를 만들고 통계를 갱신합니다 (쓰기 가능한 연결 필요, 여러 번 실행해도 안전)."""
+    for name in OBSOLETE_CALENDAR_INDEXES: conn.execute(f"DROP INDEX IF EXISTS {name}")
+    for sql in CALENDAR_INDEXES: conn.execute(sql)
+    conn.execute("ANALYZE calenda_data")
+    conn.commit()
+
+def check_query_plans(conn):
+    """CALENDAR_QUERIES 의 실행 계획을 확인해 (이름, 계획) 문제 목록을 돌려줍니다.
+    커버링 인덱스 없이 테이블을 훑거나(SCAN) 정렬용 임시 B-tree 를 만들면 문제로 봅니다."""
+    problems = []
+    for name, sql in CALENDAR_QUERIES.items():
+        plan = conn.execute("EXPLAIN QUERY PLAN " + sql, (0,) * sql.count("?")).fetchall()
+        for row in plan:
+            detail = row[-1]
+            if ("SCAN" in detail and "COVERING INDEX" not in detail) or "TEMP B-TREE" in detail:
+                problems.append((name, detail))
+    return problems
+
+# =========================================================
+# ★ 만세력 인메모리 인덱스 (양력 일자 서수 → 컬럼 배열)
+# =========================================================
+class CalendarIndex:
+    """calenda_data 전체를 한 번 읽어 일자 서수(date.toordinal) 기준 배열로 보관합니다.
+    간지는 GANJI_60 인덱스(0~59)로 저장하고, 조회 시 문자열로 되돌립니다.
+    음력 연도는 양력 연도와의 차이(0/1)로, 윤달 여부는 0/1 플래그로 저장합니다."""
+
+    def __init__(self, base_ordinal, lunar_month, lunar_day, year_ganji, month_ganji, day_ganji, lunar_year_delta, leap_month, ganji_names=None):
+        self.base_ordinal = base_ordinal
+        self.lunar_month = lunar_month  # 0 이면 해당 일자 데이터 없음
+        self.lunar_day = lunar_day
+        self.year_ganji = year_ganji
+        self.month_ganji = month_ganji
+        self.day_ganji = day_ganji
+        self.lunar_year_delta = lunar_year_delta
+        self.leap_month = leap_month
+        self.ganji_names = ganji_names or GANJI_60
+        self._lunar_keys = None
+        self._monthly = None
+        self._terms = None
+
+    def __len__(self):
+        return len(self.lunar_month)
+
+    def offset(self, ordinal):
+        i = ordinal - self.base_ordinal
+        if 0 <= i < len(self.lunar_month) and self.lunar_month[i]:
+            return i
+        return None
+
+    def row_at(self, i):
+        # 기존 get_db_data 반환 형식과 동일: (음력월, 음력일, 년주, 월주, 일주, 양력년, 양력월, 양력일)
+        d = date.fromordinal(self.base_ordinal + i)
+        names = self.ganji_names
+        return (self.lunar_month[i], self.lunar_day[i], names[self.year_ganji[i]], names[self.month_ganji[i]], names[self.day_ganji[i]], d.year, d.month, d.day)
+
+    def solar_row(self, year, month, day):
+        try: ordinal = date(int(year), int(month), int(day)).toordinal()
+        except (TypeError, ValueError): return None
+        i = self.offset(ordinal)
+        return self.row_at(i) if i is not None else None
+
+    def lunar_date_at(self, i):
+        # (음력년, 음력월, 윤달여부, 음력일)
+        year = date.fromordinal(self.base_ordinal + i).year - self.lunar_year_delta[i]
+        return year, self.lunar_month[i], bool(self.leap_month[i]), self.lunar_day[i]
+
+    def lunar_row(self, year, month, day, is_leap=False):
+        # 음력 (년, 월, 윤달, 일) → 정확히 한 행 (없으면 None, 추측하지 않음)
+        if self._lunar_keys is None:
+            keys = {}
+            for i in range(len(self.lunar_month)):
+                if self.lunar_month[i]:
+                    keys[_lunar_key(*self.lunar_date_at(i))] = i
+            self._lunar_keys = keys
+        try: i = self._lunar_keys.get(_lunar_key(int(year), int(month), bool(is_leap), int(day)))
+        except (TypeError, ValueError): return None
+        return self.row_at(i) if i is not None else None
+
+    def monthly_ganji(self):
+        # (양력년, 월) → (세운 년주, 월건 월주), 매월 15일 기준. 처음 쓸 때 전체 기간을 한 번만 만듦
+        if self._monthly is None:
+            names = self.ganji_names
+            first = date.fromordinal(self.base_ordinal).year
+            last = date.fromordinal(self.base_ordinal + len(self) - 1).year
+            table = {}
+            for y in range(first, last + 1):
+                for m in range(1, 13):
+                    i = self.offset(date(y, m, 15).toordinal())
+                    if i is not None: table[(y, m)] = (names[self.year_ganji[i]], names[self.month_ganji[i]])
+            self._monthly = table
+        return self._monthly
+
+    def term_boundaries(self):
+        # 절입일(월주가 바뀌는 날)의 일자 서수, 오름차순. 처음 쓸 때 한 번만 만듦 (데이터가 끊긴 구간 직후는 제외)
+        if self._terms is None:
+            terms, prev = array('l'), None
+            for i, g in enumerate(self.month_ganji):
+                if not self.lunar_month[i]:
+                    prev = None
+                    continue
+                if prev is not None and g != prev: terms.append(self.base_ordinal + i)
+                prev = g
+            self._terms = terms
+        return self._terms
+
+    def term_span(self, ordinal):
+        # ordinal 이 속한 절기 구간의 (직전 절입일, 다음 절입일) 서수. 데이터 범위 밖이면 해당 쪽은 None
+        terms = self.term_boundaries()
+        k = bisect_right(terms, ordinal)
+        return (terms[k - 1] if k else None), (terms[k] if k < len(terms) else None)
+
+def _lunar_key(year, month, is_leap, day):
+    return ((year * 13 + month) * 2 + int(is_leap)) * 32 + day
+
+def build_calendar_index(conn):
+    cursor = conn.cursor()
+    cursor.execute(CALENDAR_QUERIES["all"])
+    rows = cursor.fetchall()
+    if not rows: return None
+
+    names = list(GANJI_60)
+    codes = {g: i for i, g in enumerate(names)}
+    def code(g):
+        # 60갑자 이외의 값이 섞여 있어도 버리지 않고 뒤에 추가
+        if g not in codes:
+            codes[g] = len(names)
+            names.append(g)
+        return codes[g]
+
+    ordinals = [date(int(r[0]), int(r[1]), int(r[2])).toordinal() for r in rows]
+    base = min(ordinals)
+    size = max(ordinals) - base + 1
+    cols = [array('B', bytes(size)) for _ in range(7)]
+    lunar_year, prev_month, prev_ordinal, leap = None, 0, None, 0
+    for ordinal, r in zip(ordinals, rows):
+        i = ordinal - base
+        sy, sm, lm, ld = int(r[0]), int(r[1]), int(r[3]), int(r[4])
+        cols[0][i], cols[1][i] = lm, ld
+        cols[2][i], cols[3][i], cols[4][i] = code(r[5]), code(r[6]), code(r[7])
+
+        # 음력 연도/윤달은 테이블에 없으므로 날짜 순서로 유도
+        # - 같은 월 번호가 1일부터 다시 시작하면 윤달
+        # - 12월 다음 1월이 시작되면 음력 연도 증가
+        if prev_ordinal is None or ordinal != prev_ordinal + 1:
+            lunar_year = sy if lm <= sm else sy - 1
+            leap = 0
+        elif ld == 1:
+            leap = 1 if lm == prev_month else 0
+            if lm == 1 and prev_month == 12: lunar_year += 1
+        if sy - lunar_year not in (0, 1):
+            # 순서 유도가 어긋나면 (데이터 누락 등) 해당 일자 기준으로 재설정
+            lunar_year = sy if lm <= sm else sy - 1
+        cols[5][i], cols[6][i] = sy - lunar_year, leap
+        prev_month, prev_ordinal = lm, ordinal
+    return CalendarIndex(base, *cols, ganji_names=names)
+
+# =========================================================
+# ★ 컴파일된 만세력 파일 (calenda_data → 고정 길이 바이너리, mmap 으로 읽음)
+# =========================================================
+# 원본은 항상 SQLite(calenda_data). manage_db.py export-calendar 로 만들고, 워커 여러 개가 같은 페이지를 공유함
+# 헤더: 매직, 형식 버전, 레코드 크기, 첫 일자 서수, 일수, 간지 이름 길이, 원본 지문(행 수, max rowid), CRC32
+# 레코드(하루 8바이트): 음력월, 음력일, 년주, 월주, 일주, 음력년 차이, 윤달, 여백 (양력 날짜는 위치로 계산)
+CALENDAR_FILE_MAGIC = b"SAJUCAL\0"
+CALENDAR_FILE_VERSION = 1
+_CALENDAR_HEADER = struct.Struct("<8sHHIIIIII")
+_CALENDAR_RECORD = 8
+
+def export_calendar_file(conn, path):
+    """calenda_data 를 컴파일된 만세력 파일로 저장합니다 (임시 파일에 쓴 뒤 교체). 반환: (일수, 파일 크기)"""
+    index = build_calendar_index(conn)
+    if index is None: raise ValueError("calenda_data 에 데이터가 없습니다.")
+    count = len(index)
+    records = bytearray(count * _CALENDAR_RECORD)
+    columns = [index.lunar_month, index.lunar_day, index.year_ganji, index.month_ganji, index.day_ganji, index.lunar_year_delta, index.leap_month]
+    for k, column in enumerate(columns): records[k::_CALENDAR_RECORD] = column
+    names = "\n".join(index.ganji_names).encode("utf-8")
+    src_count, src_max_rowid = _calendar_fingerprint(conn)
+    header = _CALENDAR_HEADER.pack(CALENDAR_FILE_MAGIC, CALENDAR_FILE_VERSION, _CALENDAR_RECORD, index.base_ordinal, count,
+                                   len(names), src_count, src_max_rowid or 0, zlib.crc32(records, zlib.crc32(names)))
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(names)
+        f.write(records)
+    os.replace(tmp, path)
+    return count, len(header) + len(names) + len(records)
+
+def is_calendar_file(path):
+    try:
+        with open(path, "rb") as f: return f.read(len(CALENDAR_FILE_MAGIC)) == CALENDAR_FILE_MAGIC
+    except OSError: return False
+
+def read_calendar_file(path, verify=True):
+    """컴파일된 만세력 파일을 mmap 으로 열어 CalendarIndex 를 만듭니다 (컬럼은 복사 없이 간격 있는 memoryview).
+    반환: (CalendarIndex, 지문) - 형식이 다르거나 체크섬이 맞지 않으면 ValueError"""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, version, record_size, base, count, names_len, src_count, src_max_rowid, crc = _CALENDAR_HEADER.unpack_from(mm)
+    except struct.error:
+        mm.close()
+        raise ValueError(f"만세력 파일 헤더가 손상되었습니다: {path}")
+    start = _CALENDAR_HEADER.size
+    if magic != CALENDAR_FILE_MAGIC or version != CALENDAR_FILE_VERSION or record_size != _CALENDAR_RECORD or len(mm) != start + names_len + count * record_size:
+        mm.close()
+        raise ValueError(f"지원하지 않거나 손상된 만세력 파일입니다: {path}")
+    view = memoryview(mm)
+    if verify and zlib.crc32(view[start:]) != crc:
+        view.release()
+        mm.close()
+        raise ValueError(f"만세력 파일 체크섬이 맞지 않습니다: {path}")
+    names = bytes(view[start:start + names_len]).decode("utf-8").split("\n")
+    records = view[start + names_len:]
+    lm, ld, ygz, mgz, dgz, ly_delta, leap = (records[k::record_size] for k in range(7))
+    return CalendarIndex(base, lm, ld, ygz, mgz, dgz, ly_delta, leap, ganji_names=names), (src_count, src_max_rowid, crc)
+
+_CALENDAR_INDEX = None
+_CALENDAR_PATH = None     # load_calendar_index 로 지정한 경로 (없으면 get_db_path)
+_CALENDAR_SOURCE = None   # (경로, 파일 stat, calenda_data 지문) - 변경 감지용
+_CALENDAR_CHECKED = 0.0
+_CALENDAR_LOCK = threading.Lock()
+CALENDAR_CHECK_INTERVAL = 30  # 초 단위, 이 간격으로만 DB 파일 변경 여부 확인
+_CALENDAR_LISTENERS = []      # 만세력이 바뀌면 호출할 캐시 초기화 함수들
+
+def _file_stat(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def _open_calendar_ro(path):
+    # immutable=1 이면 잠금/변경 확인을 생략 (파일 교체는 stat + 지문으로 따로 감지)
+    uri = Path(path).resolve().as_uri() + "?mode=ro" + ("&immutable=1" if CALENDAR_IMMUTABLE else "")
+    conn = sqlite3.connect(uri, uri=True)
+    conn.execute(f"PRAGMA mmap_size={CALENDAR_MMAP_SIZE}")
+    return conn
+
+def _calendar_fingerprint(conn):
+    return tuple(conn.execute("SELECT count(*), max(rowid) FROM calenda_data").fetchone())
+
+def _build_calendar_from(path):
+    # SQLite DB 또는 컴파일된 만세력 파일 모두 허용
+    stat = _file_stat(path)
+    if is_calendar_file(path):
+        index, fingerprint = read_calendar_file(path)
+        return index, (path, stat, fingerprint)
+    conn = _open_calendar_ro(path)
+    try: return build_calendar_index(conn), (path, stat, _calendar_fingerprint(conn))
+    finally: conn.close()
+
+def _source_fingerprint(path):
+    if is_calendar_file(path):
+        with open(path, "rb") as f: header = _CALENDAR_HEADER.unpack(f.read(_CALENDAR_HEADER.size))
+        return header[6:9]  # (원본 행 수, 원본 max rowid, CRC32)
+    conn = _open_calendar_ro(path)
+    try: return _calendar_fingerprint(conn)
+    finally: conn.close()
+
+def on_calendar_change(callback):
+    # 만세력 데이터에 의존하는 캐시는 여기에 초기화 함수를 등록
+    _CALENDAR_LISTENERS.append(callback)
+    return callback
+
+def reload_calendar():
+    # 인덱스와 의존 캐시를 모두 비움 (다음 조회 때 다시 생성)
+    global _CALENDAR_INDEX, _CALENDAR_SOURCE
+    with _CALENDAR_LOCK:
+        _CALENDAR_INDEX, _CALENDAR_SOURCE = None, None
+    for callback in list(_CALENDAR_LISTENERS): callback()
+
+def _calendar_changed():
+    # 파일 stat 이 바뀐 경우에만 지문 쿼리로 calenda_data 자체가 바뀌었는지 확인
+    # (같은 파일의 users/consultations 쓰기만으로는 인덱스를 다시 만들지 않음)
+    global _CALENDAR_SOURCE
+    path, stat, fingerprint = _CALENDAR_SOURCE
+    try: new_stat = _file_stat(path)
+    except OSError: return True
+    if new_stat == stat: return False
+    try: new_fingerprint = _source_fingerprint(path)
+    except Exception: return True
+    if new_fingerprint != fingerprint: return True
+    _CALENDAR_SOURCE = (path, new_stat, fingerprint)
+    return False
+
+def get_calendar_index():
+    # 프로세스 전체에서 한 번만 생성 (DB 파일이 없거나 비어 있으면 None)
+    global _CALENDAR_INDEX, _CALENDAR_SOURCE, _CALENDAR_CHECKED
+    if _CALENDAR_INDEX is not None:
+        now = time.monotonic()
+        if now - _CALENDAR_CHECKED < CALENDAR_CHECK_INTERVAL: return _CALENDAR_INDEX
+        _CALENDAR_CHECKED = now
+        if _CALENDAR_SOURCE is None or not _calendar_changed(): return _CALENDAR_INDEX
+        reload_calendar()
+    db_path = _CALENDAR_PATH or get_db_path()
+    if not db_path: return None
+    with _CALENDAR_LOCK:
+        if _CALENDAR_INDEX is None:
+            try:
+                _CALENDAR_INDEX, _CALENDAR_SOURCE = _build_calendar_from(db_path)
+                _CALENDAR_CHECKED = time.monotonic()
+            except Exception:
+                logger.exception("만세력 인덱스를 만들지 못했습니다: %s", db_path)
+                return None
+    return _CALENDAR_INDEX
+
+def load_calendar_index(db_path):
+    # 배치 워커 등에서 경로를 지정해 인덱스를 올림 (SQLite 는 읽기 전용 mode=ro, 컴파일된 파일은 mmap)
+    global _CALENDAR_INDEX, _CALENDAR_PATH, _CALENDAR_SOURCE, _CALENDAR_CHECKED
+    index, source = _build_calendar_from(db_path)
+    with _CALENDAR_LOCK:
+        _CALENDAR_INDEX, _CALENDAR_PATH, _CALENDAR_SOURCE = index, db_path, source
+        _CALENDAR_CHECKED = time.monotonic()
+    return index
+
+def get_db_data(year, month, day, is_lunar=False, is_leap=False):
+    index = get_calendar_index()
+    if not index: return None # 파일이 없으면 데이터 조회 불가
+    if is_lunar:
+        # 음력 검색: (음력년, 월, 윤달, 일) 역인덱스로 한 번에 조회
+        return index.lunar_row(year, month, day, is_leap)
+    # 양력 검색: 인메모리 인덱스에서 O(1) 조회
+    return index.solar_row(year, month, day)
+
+# =========================================================
+# ★ 길일/흉일 산출 엔진 (연도/기간 무관)
+# =========================================================
+STEMS = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
+NOBLEMAN_MAP = {'甲': ['丑', '未'], '戊': ['丑', '未'], '庚': ['丑', '未'], '乙': ['子', '申'], '己': ['子', '申'], '丙': ['亥', '酉'], '丁': ['亥', '酉'], '壬': ['巳', '卯'], '癸': ['巳', '卯'], '辛': ['午', '寅']}
+YUK_HAP_MAP = {'子': '丑', '丑': '子', '寅': '亥', '亥': '寅', '卯': '戌', '戌': '卯', '辰': '酉', '酉': '辰', '巳': '申', '申': '巳', '午': '未', '未': '午'}
+YUK_HAI_MAP = {'子': '未', '丑': '午', '寅': '巳', '巳': '寅', '卯': '辰', '辰': '卯', '申': '亥', '亥': '申', '酉': '戌', '戌': '酉', '午': '丑', '未': '子'}
+XING_MAP = {'寅': ['巳', '申'], '巳': ['寅', '申'], '申': ['寅', '巳'], '丑': ['戌', '未'], '戌': ['丑', '未'], '未': ['丑', '戌'], '子': ['卯'], '卯': ['子'], '辰': ['辰'], '午': ['午'], '酉': ['酉'], '亥': ['亥']}
+GONGMANG_TABLE = {10: ['戌', '亥'], 8: ['申', '酉'], 6: ['午', '未'], 4: ['辰', '巳'], 2: ['寅', '卯'], 0: ['子', '丑']}
+
+def day_branch_rules(user_day_stem, user_day_branch):
+    """내담자 일주 기준으로 12지지 각각의 (길일 사유, 흉일 사유) 표를 만듭니다.
+    날짜별 판단은 이 표를 그날 일지 인덱스로 찾아보기만 하면 됩니다."""
+    my_branch_idx = BRANCHES.index(user_day_branch)
+    chung_branch = BRANCHES[(my_branch_idx + 6) % 12]
+    diff = (my_branch_idx - STEMS.index(user_day_stem)) % 12
+    my_gongmang = GONGMANG_TABLE.get(diff, [])
+
+    good, bad = [], []
+    for day_branch in BRANCHES:
+        reasons_good = []
+        if day_branch in NOBLEMAN_MAP.get(user_day_stem, []): reasons_good.append("천을귀인")
+        if YUK_HAP_MAP.get(user_day_branch) == day_branch: reasons_good.append("육합")
+        reasons_bad = []
+        if day_branch == chung_branch: reasons_bad.append("충")
+        if day_branch in my_gongmang: reasons_bad.append("공망")
+        if YUK_HAI_MAP.get(user_day_branch) == day_branch: reasons_bad.append("육해")
+        if day_branch in XING_MAP.get(user_day_branch, []): reasons_bad.append("형살")
+        good.append(tuple(reasons_good))
+        bad.append(tuple(reasons_bad))
+    return good, bad
+
+def scan_lucky_days(user_day_stem, user_day_branch, start, end):
+    """start~end(포함) 기간의 길일/흉일을 한 번에 산출합니다.
+    반환: [{"date": date, "ganji": "丙午", "good": [...], "bad": [...]}, ...] (사유가 있는 날만)"""
+    index = get_calendar_index()
+    if not index: return []
+    good_table, bad_table = day_branch_rules(user_day_stem, user_day_branch)
+
+    # 기간의 일진(간지 코드)을 배열 조각으로 한 번에 가져옴
+    lo = max(start.toordinal() - index.base_ordinal, 0)
+    hi = min(end.toordinal() - index.base_ordinal + 1, len(index))
+    if lo >= hi: return []
+    names = index.ganji_names
+    branch_of = [BRANCHES.index(g[1]) if len(g) > 1 and g[1] in BRANCHES else -1 for g in names]
+    codes = index.day_ganji[lo:hi]
+    present = index.lunar_month[lo:hi]
+
+    results = []
+    base = index.base_ordinal + lo
+    for i, (code, ok) in enumerate(zip(codes, present)):
+        b = branch_of[code]
+        if not ok or b < 0: continue
+        good, bad = good_table[b], bad_table[b]
+        if good or bad:
+            results.append({"date": date.fromordinal(base + i), "ganji": names[code], "good": list(good), "bad": list(bad)})
+    return results
+
+def scan_lucky_days_for_year(user_day_stem, user_day_branch, year):
+    return scan_lucky_days(user_day_stem, user_day_branch, date(year, 1, 1), date(year, 12, 31))
+
+# =========================================================
+# ★ 사주 원국 / 자미두수 / 대운 계산
+# =========================================================
+def calculate_time_pillar(day_stem, hour):
+    time_idx = (hour + 1) // 2 
+    if time_idx >= 12: time_idx = 0 
+    time_branch = BRANCHES[time_idx] 
+    stems = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
+    if day_stem not in stems: return "??", time_idx
+    day_idx = stems.index(day_stem)
+    start_stem_idx = (day_idx % 5) * 2
+    time_stem_idx = (start_stem_idx + time_idx) % 10
+    return stems[time_stem_idx] + time_branch, time_idx
+
+def get_jami_data(lunar_month, time_idx, year_stem, lunar_day):
+    myung_idx = (2 + (lunar_month - 1) - time_idx) % 12
+    myung_gung = BRANCHES[myung_idx]
+    stems = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
+    try: y_idx = stems.index(year_stem)
+    except: y_idx = 0
+    start = (y_idx % 5) * 2 + 2 
+    off = myung_idx - 2
+    if off < 0: off += 12
+    m_stem = (start + off) % 10
+    code = (m_stem // 2 + myung_idx // 2) % 5
+    guk_map = {0: 4, 1: 2, 2: 6, 3: 5, 4: 3}
+    guk = guk_map[code]
+    ziwei_idx = (lunar_day + guk) % 12 
+    stars = {'자미': ziwei_idx, '천부': (10 - ziwei_idx) % 12, '태양': (ziwei_idx - 3) % 12, '무곡': (ziwei_idx - 4) % 12, '천동': (ziwei_idx - 5) % 12, '염정': (ziwei_idx - 8) % 12, '천기': (ziwei_idx - 1) % 12, '태음': (10 - ziwei_idx + 1) % 12, '탐랑': (10 - ziwei_idx + 2) % 12, '거문': (10 - ziwei_idx + 3) % 12, '천상': (10 - ziwei_idx + 4) % 12, '천량': (10 - ziwei_idx + 5) % 12, '칠살': (10 - ziwei_idx + 6) % 12, '파군': (10 - ziwei_idx + 10) % 12}
+    my_stars = [s for s, i in stars.items() if BRANCHES[i] == myung_gung]
+    if not my_stars: return myung_gung, "명무정요"
+    return myung_gung, ", ".join(my_stars)
+
+DEFAULT_DAEWOON_SU = 6  # 절기 데이터로 계산할 수 없을 때 쓰는 대운수
+
+def calculate_daewoon_su(birth_date, direction):
+    """순행이면 다음 절입일까지, 역행이면 직전 절입일부터의 날 수를 3으로 나눠 반올림 (1~10).
+    만세력 인덱스가 없거나 절입일이 범위 밖이면 DEFAULT_DAEWOON_SU."""
+    index = get_calendar_index()
+    if not index: return DEFAULT_DAEWOON_SU
+    try: ordinal = birth_date.toordinal()
+    except AttributeError: return DEFAULT_DAEWOON_SU
+    if index.offset(ordinal) is None: return DEFAULT_DAEWOON_SU
+    prev_term, next_term = index.term_span(ordinal)
+    if direction > 0:
+        if next_term is None: return DEFAULT_DAEWOON_SU
+        days = next_term - ordinal
+    else:
+        if prev_term is None: return DEFAULT_DAEWOON_SU
+        days = ordinal - prev_term
+    return min(max(round(days / 3), 1), 10)
+
+def get_solar_terms(start_year, end_year=None):
+    # start_year~end_year(포함) 의 절입일 목록: [(양력 date, 새 월주), ...]
+    index = get_calendar_index()
+    if not index: return []
+    end_year = start_year if end_year is None else end_year
+    terms = index.term_boundaries()
+    lo = bisect_right(terms, date(int(start_year), 1, 1).toordinal() - 1)
+    hi = bisect_right(terms, date(int(end_year), 12, 31).toordinal())
+    names = index.ganji_names
+    return [(date.fromordinal(o), names[index.month_ganji[o - index.base_ordinal]]) for o in terms[lo:hi]]
+
+def calculate_daewoon(gender, year_pillar, month_pillar, day_pillar, birth_date):
+    # birth_date: 양력 생일 (date) → 절입일까지의 날 수로 대운수 산출
+    yang_stems = ['甲', '丙', '戊', '庚', '壬']
+    year_stem = year_pillar[0]
+    is_year_yang = year_stem in yang_stems
+    is_man = (gender == '남성')
+    direction = 1 if (is_man and is_year_yang) or (not is_man and not is_year_yang) else -1
+    daewoon_su = calculate_daewoon_su(birth_date, direction)
+    try: start_idx = GANJI_60.index(month_pillar)
+    except: return [] 
+    daewoon_list = []
+    for i in range(1, 9): 
+        idx = (start_idx + (i * direction)) % 60
+        ganji = GANJI_60[idx]
+        start_age = daewoon_su + ((i-1) * 10)
+        daewoon_list.append(f"{start_age}({ganji})")
+    return daewoon_list
+
+# =========================================================
+# ★ analyze_user 메모이제이션 (프로세스 전역 LRU)
+# =========================================================
+class LRUCache:
+    """스레드 안전한 크기 제한 LRU 캐시. 적중률/크기/제거 건수를 stats() 로 확인합니다."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._data), "maxsize": self.maxsize, "hit_ratio": self.hits / total if total else 0.0}
+
+ANALYZE_CACHE = LRUCache(maxsize=4096)
+on_calendar_change(ANALYZE_CACHE.clear)
+_MISSING = object()
+
+def analyze_cache_stats():
+    return ANALYZE_CACHE.stats()
+
+def _copy_result(res):
+    # 호출한 쪽에서 리스트/딕셔너리를 수정해도 캐시 값이 바뀌지 않도록 얕은 복사
+    return {k: (list(v) if isinstance(v, list) else dict(v) if isinstance(v, dict) else v) for k, v in res.items()}
+
+def analyze_user(year, month, day, hour, is_lunar=False, gender='남성', is_leap=False):
+    try: key = (int(year), int(month), int(day), int(hour), bool(is_lunar), gender, bool(is_lunar and is_leap))
+    except (TypeError, ValueError): return _analyze_user(year, month, day, hour, is_lunar, gender, is_leap)
+    # 캐시 적중 때도 만세력 변경 여부를 먼저 확인 (간격 내에는 시각 비교만, 바뀌었으면 ANALYZE_CACHE 도 비워짐)
+    get_calendar_index()
+    res = ANALYZE_CACHE.get(key, _MISSING)
+    if res is _MISSING:
+        res = _analyze_user(*key)
+        # 오류 결과는 캐시하지 않음 (DB 파일이 나중에 올라오는 경우 등)
+        if "error" not in res: ANALYZE_CACHE.put(key, res)
+    return _copy_result(res)
+
+def _analyze_user(year, month, day, hour, is_lunar=False, gender='남성', is_leap=False):
+    db_data = get_db_data(year, month, day, is_lunar, is_leap)
+    if not db_data: 
+        # DB 파일은 있는데 해당 날짜가 없는 경우 vs DB 파일 자체가 없는 경우
+        if not get_calendar_index():
+            return {"error": "saju.db 파일이 서버에 없습니다. 깃허브에 업로드해주세요."}
+        return {"error": "만세력 데이터에 해당 날짜가 없습니다."}
+    
+    try:
+        lunar_month, lunar_day = int(db_data[0]), int(db_data[1])
+        year_p, month_p, day_p = db_data[2], db_data[3], db_data[4]
+    except: return {"error": "데이터 파싱 오류"}
+        
+    time_p, time_idx = calculate_time_pillar(day_p[0], hour)
+    myung_loc, myung_star = get_jami_data(lunar_month, time_idx, year_p[0], lunar_day)
+    # 음력 입력이어도 DB 행의 양력 날짜로 절입일까지의 거리를 잼
+    daewoon = calculate_daewoon(gender, year_p, month_p, day_p, date(db_data[5], db_data[6], db_data[7]))
+    
+    return {
+        "입력기준": ("음력(윤달)" if is_leap else "음력") if is_lunar else "양력",
+        "음력": f"{lunar_month}월 {lunar_day}일",
+        "사주": [year_p, month_p, day_p, time_p],
+        "대운": daewoon,
+        "자미두수": {"명궁위치": myung_loc, "명궁주성": myung_star}
+    }
+
+# =========================================================
+# ★ 대량 분석 (고객 명단 일괄 처리)
+# =========================================================
+ANALYZE_MANY_COLUMNS = ["year_pillar", "month_pillar", "day_pillar", "hour_pillar", "daewoon", "lunar_date", "myung_gung", "myung_star", "error"]
+
+def _parse_birth_date(value):
+    # date / datetime / pandas Timestamp / 'YYYY-MM-DD' / 'YYYYMMDD' 모두 허용
+    if hasattr(value, "year") and hasattr(value, "month") and hasattr(value, "day"):
+        return int(value.year), int(value.month), int(value.day)
+    text = str(value).strip().replace(".", "-").replace("/", "-")
+    if len(text) == 8 and text.isdigit():
+        return int(text[:4]), int(text[4:6]), int(text[6:])
+    y, m, d = text.split("-")[:3]
+    return int(y), int(m), int(d[:2])
+
+def normalize_birth_record(record):
+    """(date, hour, lunar, gender[, leap]) 튜플 또는 같은 키를 가진 dict 를
+    analyze_user 인자 (year, month, day, hour, is_lunar, gender, is_leap) 로 바꿉니다."""
+    if isinstance(record, dict):
+        get = record.get
+        birth = get("date", get("birth_date"))
+        hour, lunar = get("hour", 0), get("lunar", get("is_lunar", False))
+        gender, leap = get("gender", '남성'), get("leap", get("is_leap", False))
+    else:
+        # 짧은 튜플은 빠진 자리만 기본값으로 채움 (('1980-01-01', 14) → 양력, 남성)
+        birth, hour, lunar, gender = (tuple(record) + ('', 0, False, '남성')[len(record):])[:4]
+        leap = record[4] if len(record) > 4 else False
+    y, m, d = _parse_birth_date(birth)
+    is_lunar = _parse_flag(lunar, ("음력", "lunar"))
+    hour = 0 if _is_blank(hour) else int(hour)
+    gender = '남성' if _is_blank(gender) else gender
+    return y, m, d, hour, is_lunar, gender, is_lunar and _parse_flag(leap, ("윤달", "윤월", "leap"))
+
+def _is_blank(value):
+    # None, 빈 문자열, DataFrame 의 빈 칸(NaN)
+    if isinstance(value, str): return not value.strip()
+    return value is None or value != value
+
+def _parse_flag(value, true_words):
+    if isinstance(value, str):
+        return value.strip().lower() in true_words + ("true", "1", "y", "yes")
+    return bool(value) and value == value  # NaN 은 False
+
+def analyze_record(record):
+    # 레코드 1건 → ANALYZE_MANY_COLUMNS 형태의 dict (오류는 error 값으로)
+    row = dict.fromkeys(ANALYZE_MANY_COLUMNS)
+    try:
+        res = analyze_user(*normalize_birth_record(record))
+    except Exception as e:
+        res = {"error": f"입력 형식 오류: {e}"}
+    if "error" in res:
+        row["error"] = res["error"]
+    else:
+        row["year_pillar"], row["month_pillar"], row["day_pillar"], row["hour_pillar"] = res["사주"]
+        row["daewoon"] = res["대운"]
+        row["lunar_date"] = res["음력"]
+        row["myung_gung"] = res["자미두수"]["명궁위치"]
+        row["myung_star"] = res["자미두수"]["명궁주성"]
+    return row
+
+def analyze_many(records):
+    """여러 명의 생년월일을 한 번에 분석해 DataFrame 으로 돌려줍니다.
+    만세력은 인메모리 인덱스(get_calendar_index, 전체 테이블 1회 조회)에서 찾으므로 사람마다 쿼리를 하지 않습니다.
+    잘못된 행은 예외 대신 error 컬럼에 사유를 남깁니다."""
+    import pandas as pd  # 이 함수를 쓸 때만 불러옴 (import saju_core 는 pandas 없이 가볍게)
+    if isinstance(records, pd.DataFrame):
+        source = records.reset_index(drop=True)
+        items = source.to_dict("records")
+    else:
+        items = list(records)
+        source = None
+
+    result = pd.DataFrame([analyze_record(record) for record in items], columns=ANALYZE_MANY_COLUMNS)
+    if source is not None:
+        result = pd.concat([source, result], axis=1)
+    return result
+
+# =========================================================
+# ★ 월별 간지 (세운 / 월건)
+# =========================================================
+def get_monthly_ganji(year, month):
+    # 15일 기준 월별 간지 표에서 조회
+    index = get_calendar_index()
+    data = index.monthly_ganji().get((year, month)) if index else None
+    return {"year_ganji": data[0], "month_ganji": data[1]} if data else None
+
+def get_monthly_ganji_range(start_year, end_year=None):
+    """start_year~end_year(포함) 구간의 월별 세운/월건 간지를 한 번에 돌려줍니다.
+    반환: {(년, 월): {"year_ganji": 년주, "month_ganji": 월주}} (DB 에 없는 달은 빠짐)"""
+    index = get_calendar_index()
+    if not index: return {}
+    end_year = start_year if end_year is None else end_year
+    table = index.monthly_ganji()
+    return {(y, m): {"year_ganji": table[(y, m)][0], "month_ganji": table[(y, m)][1]}
+            for y in range(int(start_year), int(end_year) + 1) for m in range(1, 13) if (y, m) in table}
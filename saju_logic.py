@@ -1,225 +1,456 @@
 import sqlite3
-import pandas as pd
-import streamlit as st # 에러 출력을 위해 추가
 import os
+import json
+import hashlib
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
 
-# 60갑자 리스트
-GANJI_60 = [
-    '甲子', '乙丑', '丙寅', '丁卯', '戊辰', '己巳', '庚午', '辛未', '壬申', '癸酉',
-    '甲戌', '乙亥', '丙子', '丁丑', '戊寅', '己卯', '庚辰', '辛巳', '壬午', '癸未',
-    '甲申', '乙酉', '丙戌', '丁亥', '戊子', '己丑', '庚寅', '辛卯', '壬辰', '癸巳',
-    '甲午', '乙未', '丙申', '丁酉', '戊戌', '己亥', '庚子', '辛丑', '壬寅', '癸卯',
-    '甲辰', '乙巳', '丙午', '丁未', '戊申', '己酉', '庚戌', '辛亥', '壬子', '癸丑',
-    '甲寅', '乙卯', '丙辰', '丁巳', '戊午', '己未', '庚申', '辛酉', '壬戌', '癸亥'
-]
+# 계산/만세력 조회는 saju_core (streamlit, pandas 없이 import 가능). 기존 import 경로도 그대로 쓰도록 다시 내보냄
+from saju_core import (
+    GANJI_60, BRANCHES, get_db_path, logger,
+    CalendarIndex, build_calendar_index, is_calendar_file, get_calendar_index, load_calendar_index, reload_calendar, on_calendar_change, get_db_data,
+    get_monthly_ganji, get_monthly_ganji_range, get_solar_terms,
+    day_branch_rules, scan_lucky_days, scan_lucky_days_for_year,
+    calculate_time_pillar, get_jami_data, calculate_daewoon, calculate_daewoon_su,
+    analyze_user, analyze_cache_stats, analyze_record, analyze_many, normalize_birth_record, ANALYZE_MANY_COLUMNS,
+)
 
-BRANCHES = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
-
-def get_db_path():
-    # saju.db 파일 경로 확인
-    if os.path.exists('saju.db'):
-        return 'saju.db'
-    else:
-        # 파일이 없으면 경고
-        return None
-
-def get_db_data(year, month, day, is_lunar=False):
-    db_path = get_db_path()
-    if not db_path:
-        return None # 파일이 없으면 데이터 조회 불가
-    
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        final_result = None
-        
-        if is_lunar:
-            # 음력 검색
-            cursor.execute(f"SELECT cd_lm, cd_ld, cd_hyganjee, cd_kyganjee, cd_dyganjee, cd_sy, cd_sm, cd_sd FROM calenda_data WHERE (cd_sy={year} OR cd_sy={year+1}) AND cd_lm={month} AND cd_ld={day}")
-            rows = cursor.fetchall()
-            if not rows: 
-                conn.close()
-                return None
-            target_ganji = GANJI_60[(year - 4) % 60]
-            for row in rows:
-                if row[2] == target_ganji:
-                    final_result = row
-                    break
-            if not final_result: final_result = rows[0]
-        else:
-            # 양력 검색
-            cursor.execute(f"SELECT cd_lm, cd_ld, cd_hyganjee, cd_kyganjee, cd_dyganjee, cd_sy, cd_sm, cd_sd FROM calenda_data WHERE cd_sy={year} AND cd_sm={month} AND cd_sd={day}")
-            final_result = cursor.fetchone()
-            
+# 만세력(calenda_data)과 운영 데이터(상담원/상담 기록/캐시)는 서로 다른 DB 파일에 둠
+# - 만세력 DB: saju_core 가 읽기 전용(mode=ro, immutable=1)으로만 열어 상담 기록 쓰기와 잠금을 다투지 않음
+# - 운영 DB: WAL 모드 (읽기와 쓰기가 서로 막지 않음), 없으면 마이그레이션이 새로 만듦
+OPS_DB_PATH = os.environ.get("SAJU_OPS_DB", "saju_ops.db")
+OPS_PRAGMAS = ("PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL", "PRAGMA busy_timeout=5000")
+
+# =========================================================
+# ★ SQLite 연결 풀 (호출마다 connect/close 하지 않고 재사용)
+# =========================================================
+class ConnectionPool:
+    """DB 파일 하나에 대한 연결 풀. 반납된 연결은 최대 max_idle 개까지 보관했다가 재사용합니다.
+    sqlite3 연결마다 준비된 구문 캐시(cached_statements)가 있으므로, 같은 SQL 문자열을
+    바인딩 파라미터로 재실행하면 컴파일 없이 재사용됩니다."""
+
+    def __init__(self, path, max_idle=8, cached_statements=128, pragmas=()):
+        self.path = path
+        self.max_idle = max_idle
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas  # 새 연결마다 실행
+        self._idle = []
+        self._lock = threading.Lock()
+        self._open = 0
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=self.cached_statements)
+        for pragma in self.pragmas: conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._idle: return self._idle.pop()
+            self._open += 1
+        try: return self._connect()
+        except Exception:
+            with self._lock: self._open -= 1
+            raise
+
+    def release(self, conn):
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._open -= 1
         conn.close()
-        return final_result
-    except Exception as e:
-        # DB 조회 중 에러 발생 시 (테이블 없음 등)
-        return None
-
-def calculate_time_pillar(day_stem, hour):
-    time_idx = (hour + 1) // 2 
-    if time_idx >= 12: time_idx = 0 
-    time_branch = BRANCHES[time_idx] 
-    stems = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
-    if day_stem not in stems: return "??", time_idx
-    day_idx = stems.index(day_stem)
-    start_stem_idx = (day_idx % 5) * 2
-    time_stem_idx = (start_stem_idx + time_idx) % 10
-    return stems[time_stem_idx] + time_branch, time_idx
-
-def get_jami_data(lunar_month, time_idx, year_stem, lunar_day):
-    myung_idx = (2 + (lunar_month - 1) - time_idx) % 12
-    myung_gung = BRANCHES[myung_idx]
-    stems = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
-    try: y_idx = stems.index(year_stem)
-    except: y_idx = 0
-    start = (y_idx % 5) * 2 + 2 
-    off = myung_idx - 2
-    if off < 0: off += 12
-    m_stem = (start + off) % 10
-    code = (m_stem // 2 + myung_idx // 2) % 5
-    guk_map = {0: 4, 1: 2, 2: 6, 3: 5, 4: 3}
-    guk = guk_map[code]
-    ziwei_idx = (lunar_day + guk) % 12 
-    stars = {'자미': ziwei_idx, '천부': (10 - ziwei_idx) % 12, '태양': (ziwei_idx - 3) % 12, '무곡': (ziwei_idx - 4) % 12, '천동': (ziwei_idx - 5) % 12, '염정': (ziwei_idx - 8) % 12, '천기': (ziwei_idx - 1) % 12, '태음': (10 - ziwei_idx + 1) % 12, '탐랑': (10 - ziwei_idx + 2) % 12, '거문': (10 - ziwei_idx + 3) % 12, '천상': (10 - ziwei_idx + 4) % 12, '천량': (10 - ziwei_idx + 5) % 12, '칠살': (10 - ziwei_idx + 6) % 12, '파군': (10 - ziwei_idx + 10) % 12}
-    my_stars = [s for s, i in stars.items() if BRANCHES[i] == myung_gung]
-    if not my_stars: return myung_gung, "명무정요"
-    return myung_gung, ", ".join(my_stars)
-
-def calculate_daewoon(gender, year_pillar, month_pillar, day_pillar, birth_date):
-    yang_stems = ['甲', '丙', '戊', '庚', '壬']
-    year_stem = year_pillar[0]
-    is_year_yang = year_stem in yang_stems
-    is_man = (gender == '남성')
-    direction = 1 if (is_man and is_year_yang) or (not is_man and not is_year_yang) else -1
-    daewoon_su = 6 
-    try: start_idx = GANJI_60.index(month_pillar)
-    except: return [] 
-    daewoon_list = []
-    for i in range(1, 9): 
-        idx = (start_idx + (i * direction)) % 60
-        ganji = GANJI_60[idx]
-        start_age = daewoon_su + ((i-1) * 10)
-        daewoon_list.append(f"{start_age}({ganji})")
-    return daewoon_list
-
-def analyze_user(year, month, day, hour, is_lunar=False, gender='남성'):
-    db_data = get_db_data(year, month, day, is_lunar)
-    if not db_data: 
-        # DB 파일은 있는데 해당 날짜가 없는 경우 vs DB 파일 자체가 없는 경우
-        if not get_db_path():
-            return {"error": "saju.db 파일이 서버에 없습니다. 깃허브에 업로드해주세요."}
-        return {"error": "만세력 데이터에 해당 날짜가 없습니다."}
-    
+
+    def discard(self, conn):
+        # 오류로 상태를 알 수 없는 연결은 풀에 되돌리지 않음
+        with self._lock: self._open -= 1
+        try: conn.close()
+        except Exception: pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except sqlite3.Error:
+            self.discard(conn)
+            raise
+        except BaseException:
+            try: conn.rollback()
+            except Exception: pass
+            self.release(conn)
+            raise
+        else:
+            if conn.in_transaction: conn.rollback()  # 커밋하지 않은 변경은 버림
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle: conn.close()
+
+    @property
+    def open_count(self):
+        return self._open
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_pool(db_path=None):
+    # 풀은 운영 DB 용 (만세력은 인메모리 인덱스로 읽음)
+    db_path = db_path or OPS_DB_PATH
+    with _POOLS_LOCK:
+        pool = _POOLS.get(db_path)
+        if pool is None or pool._closed:
+            pool = _POOLS[db_path] = ConnectionPool(db_path, pragmas=OPS_PRAGMAS)
+        return pool
+
+def db_connection(db_path=None):
+    # 사용법: with db_connection() as conn: ...
+    return get_pool(db_path).connection()
+
+def open_connection_count():
+    # 현재 열려 있는 (사용 중 + 대기 중) 연결 수
+    with _POOLS_LOCK: return sum(p.open_count for p in _POOLS.values())
+
+def close_all_connections():
+    # 프로세스 종료 시 정리 (atexit 등록)
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools: pool.close()
+
+atexit.register(close_all_connections)
+
+# =========================================================
+# ★ 길일/흉일 캐시 (운영 DB, 일주 x 연도)
+# =========================================================
+LUCKY_DAY_CACHE_MAX = 600
+_LUCKY_DAY_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+_LUCKY_DAY_LOCK = threading.Lock()
+
+def _count_lucky(key, n=1):
+    with _LUCKY_DAY_LOCK: _LUCKY_DAY_STATS[key] += n
+
+def lucky_day_cache_stats():
+    with _LUCKY_DAY_LOCK: stats = dict(_LUCKY_DAY_STATS)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / total if total else 0.0
+    return stats
+
+def _encode_lucky_days(days):
+    return json.dumps([[d["date"].isoformat(), d["ganji"], d["good"], d["bad"]] for d in days], ensure_ascii=False)
+
+def _decode_lucky_days(payload):
+    return [{"date": date.fromisoformat(d), "ganji": g, "good": good, "bad": bad} for d, g, good, bad in json.loads(payload)]
+
+def warm_lucky_day_cache(year, conn=None):
+    # 해당 연도의 60일주 결과를 한 번에 계산해 저장
+    if conn is None:
+        ensure_schema()
+        with db_connection() as conn: return warm_lucky_day_cache(year, conn)
+    if not get_calendar_index(): return 0
+    now = time.time()
+    rows = [(ganji, year, _encode_lucky_days(scan_lucky_days_for_year(ganji[0], ganji[1], year)), now) for ganji in GANJI_60]
+    conn.executemany("INSERT OR REPLACE INTO lucky_day_cache (day_pillar, year, payload, last_used) VALUES (?, ?, ?, ?)", rows)
+    evicted = conn.execute("DELETE FROM lucky_day_cache WHERE rowid IN (SELECT rowid FROM lucky_day_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (LUCKY_DAY_CACHE_MAX,)).rowcount
+    conn.commit()
+    if evicted > 0: _count_lucky("evictions", evicted)
+    return len(rows)
+
+@on_calendar_change
+def _clear_lucky_day_cache():
     try:
-        lunar_month, lunar_day = int(db_data[0]), int(db_data[1])
-        year_p, month_p, day_p = db_data[2], db_data[3], db_data[4]
-    except: return {"error": "데이터 파싱 오류"}
-        
-    time_p, time_idx = calculate_time_pillar(day_p[0], hour)
-    myung_loc, myung_star = get_jami_data(lunar_month, time_idx, year_p[0], lunar_day)
-    daewoon = calculate_daewoon(gender, year_p, month_p, day_p, day)
-    
-    return {
-        "입력기준": "음력" if is_lunar else "양력",
-        "음력": f"{lunar_month}월 {lunar_day}일",
-        "사주": [year_p, month_p, day_p, time_p],
-        "대운": daewoon,
-        "자미두수": {"명궁위치": myung_loc, "명궁주성": myung_star}
-    }
+        with db_connection() as conn:
+            conn.execute("DELETE FROM lucky_day_cache")
+            conn.commit()
+    except Exception:
+        pass
 
+def get_lucky_days(user_day_stem, user_day_branch, year):
+    """scan_lucky_days_for_year 결과를 (일주, 연도) 단위로 캐시해서 돌려줍니다.
+    처음 조회하는 연도는 60일주 전체를 미리 채워 둡니다."""
+    pillar = user_day_stem + user_day_branch
+    if pillar not in GANJI_60: return scan_lucky_days_for_year(user_day_stem, user_day_branch, year)
+    try:
+        ensure_schema()
+        with db_connection() as conn:
+            row = conn.execute("SELECT payload FROM lucky_day_cache WHERE day_pillar=? AND year=?", (pillar, year)).fetchone()
+            if row:
+                conn.execute("UPDATE lucky_day_cache SET last_used=? WHERE day_pillar=? AND year=?", (time.time(), pillar, year))
+                conn.commit()
+                _count_lucky("hits")
+                return _decode_lucky_days(row[0])
+            _count_lucky("misses")
+            warm_lucky_day_cache(year, conn)
+            row = conn.execute("SELECT payload FROM lucky_day_cache WHERE day_pillar=? AND year=?", (pillar, year)).fetchone()
+            if row: return _decode_lucky_days(row[0])
+    except Exception:
+        pass
+    # 캐시 DB를 쓸 수 없으면 직접 계산
+    return scan_lucky_days_for_year(user_day_stem, user_day_branch, year)
 # =========================================================
-# ★ [안전장치] DB 초기화 (기존 데이터 보존 + 유저 테이블만 추가)
+# ★ [안전장치] DB 스키마 마이그레이션 (기존 데이터 보존 + 유저 테이블만 추가)
 # =========================================================
-def check_and_init_db():
-    db_path = 'saju.db'
-    # DB 파일이 없으면 어쩔 수 없이 에러를 피하기 위해 생성은 하되, 만세력 데이터는 없는 상태가 됨
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+# (버전, 설명, SQL 또는 함수 목록) - 운영 DB 에 적용, 만세력 테이블인 calenda_data는 건드리지 않음
+# 새 스키마 변경은 기존 항목을 고치지 말고 다음 버전 번호로 뒤에 추가할 것
+MIGRATIONS = [
+    (1, "users / consultations 테이블 생성", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY, 
+            password TEXT NOT NULL, 
+            name TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS consultations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, 
+            counselor_id TEXT, 
+            client_name TEXT, 
+            client_gender TEXT, 
+            birth_date TEXT, 
+            birth_time TEXT, 
+            consult_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP, 
+            memo TEXT, 
+            FOREIGN KEY (counselor_id) REFERENCES users (username)
+        )
+        ''',
+    ]),
+    (2, "기본 상담원 계정 (test1, test2)", [
+        # 새 운영 DB 라면 기존 saju.db 의 계정을 먼저 옮겨 담고, 계정이 하나도 없을 때만 기본 계정 추가
+        # (기본 계정이 먼저 들어가면 비밀번호를 바꾼 기존 test1 / test2 가 INSERT OR IGNORE 에 밀려 초기화됨)
+        lambda conn: copy_legacy_ops_data(conn, get_db_path()),
+        "INSERT INTO users (username, password, name) SELECT * FROM (VALUES ('test1', '1234', '상담원1'), ('test2', '1234', '상담원2')) WHERE NOT EXISTS (SELECT 1 FROM users)",
+    ]),
+    (3, "길일/흉일 캐시 테이블 (일주 x 연도)", [
+        '''
+        CREATE TABLE IF NOT EXISTS lucky_day_cache (
+            day_pillar TEXT NOT NULL, 
+            year INTEGER NOT NULL, 
+            payload TEXT NOT NULL, 
+            last_used REAL NOT NULL, 
+            PRIMARY KEY (day_pillar, year)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_lucky_day_cache_last_used ON lucky_day_cache (last_used)",
+    ]),
+    (4, "AI 보고서 캐시 테이블", [
+        '''
+        CREATE TABLE IF NOT EXISTS report_cache (
+            cache_key TEXT PRIMARY KEY, 
+            analysis_mode TEXT, 
+            model TEXT, 
+            template_version TEXT, 
+            report TEXT NOT NULL, 
+            size INTEGER NOT NULL, 
+            created_at REAL NOT NULL, 
+            last_used REAL NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_report_cache_last_used ON report_cache (last_used)",
+    ]),
+    (5, "기존 saju.db 의 users / consultations 를 운영 DB 로 복사", [
+        # 새 운영 DB 는 2번에서 이미 옮겼으므로 변화 없음 (INSERT OR IGNORE), 2번이 먼저 적용된 DB 를 위해 남겨 둠
+        lambda conn: copy_legacy_ops_data(conn, get_db_path()),
+    ]),
+    (6, "AI 보고서 백그라운드 작업 테이블", [
+        '''
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            job_id TEXT PRIMARY KEY, 
+            counselor_id TEXT NOT NULL, 
+            label TEXT, 
+            chart TEXT, 
+            analysis_mode TEXT NOT NULL, 
+            model TEXT, 
+            template_version TEXT, 
+            cache_key TEXT NOT NULL, 
+            status TEXT NOT NULL, 
+            partial TEXT, 
+            report TEXT, 
+            error TEXT, 
+            created_at REAL NOT NULL, 
+            started_at REAL, 
+            finished_at REAL, 
+            updated_at REAL NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON report_jobs (status, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_report_jobs_counselor ON report_jobs (counselor_id, status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_report_jobs_cache_key ON report_jobs (cache_key, status)",
+    ]),
+]
+
+LEGACY_OPS_TABLES = ["users", "consultations"]
+SQLITE_MAGIC = b"SQLite format 3\0"
+
+def _is_sqlite_file(path):
+    try:
+        with open(path, "rb") as f: return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except OSError: return False
+
+def copy_legacy_ops_data(conn, legacy_path):
+    """만세력 DB 에 함께 들어 있던 운영 테이블을 운영 DB 로 옮겨 담습니다 (이미 있는 행은 유지).
+    만세력 DB 는 읽기 전용으로만 열고, 같은 파일이거나 테이블이 없거나
+    SQLite 파일이 아니면 (export-calendar 로 만든 만세력 파일 등) 아무것도 하지 않습니다."""
+    if not legacy_path or not os.path.exists(legacy_path): return 0
+    if is_calendar_file(legacy_path) or not _is_sqlite_file(legacy_path): return 0
+    target = conn.execute("PRAGMA database_list").fetchone()[2]
+    if target and os.path.exists(target) and os.path.samefile(target, legacy_path): return 0
+    legacy = sqlite3.connect(Path(legacy_path).resolve().as_uri() + "?mode=ro", uri=True)
+    copied = 0
     try:
-        # 1. users 테이블이 없으면 생성 (만세력 테이블인 calenda_data는 건드리지 않음)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                username TEXT PRIMARY KEY, 
-                password TEXT NOT NULL, 
-                name TEXT
-            )
-        ''')
-        
-        # 2. consultations 테이블 생성
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS consultations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                counselor_id TEXT, 
-                client_name TEXT, 
-                client_gender TEXT, 
-                birth_date TEXT, 
-                birth_time TEXT, 
-                consult_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP, 
-                memo TEXT, 
-                FOREIGN KEY (counselor_id) REFERENCES users (username)
-            )
-        ''')
-
-        # 3. 기본 계정 확인 (없으면 추가)
-        cursor.execute("SELECT count(*) FROM users WHERE username='test1'")
-        if cursor.fetchone()[0] == 0:
-            users = [('test1', '1234', '상담원1'), ('test2', '1234', '상담원2')]
-            cursor.executemany('INSERT INTO users (username, password, name) VALUES (?, ?, ?)', users)
-            
+        for table in LEGACY_OPS_TABLES:
+            if not legacy.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone(): continue
+            cursor = legacy.execute(f"SELECT * FROM {table}")
+            columns = [c[0] for c in cursor.description]
+            sql = f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            copied += conn.executemany(sql, cursor).rowcount
+    finally:
+        legacy.close()
+    return copied
+
+def get_schema_version(conn):
+    try: return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+    except sqlite3.OperationalError: return 0  # schema_version 테이블 없음
+
+def run_migrations(conn):
+    # BEGIN IMMEDIATE 로 쓰기 잠금을 먼저 잡으므로 여러 워커가 동시에 시작해도 한 곳에서만 적용됨
+    # (나머지는 잠금이 풀린 뒤 이미 올라간 버전을 보고 건너뜀)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, description TEXT, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        current = get_schema_version(conn)
+        applied = []
+        for version, description, statements in MIGRATIONS:
+            if version <= current: continue
+            for sql in statements:
+                # 문자열은 SQL, 함수는 같은 트랜잭션 안에서 conn 을 받아 실행 (데이터 이전 등)
+                if callable(sql): sql(conn)
+                else: conn.execute(sql)
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description))
+            applied.append(version)
         conn.commit()
+        return applied
+    except BaseException:
+        conn.rollback()
+        raise
+
+_SCHEMA_READY = False
+_SCHEMA_LOCK = threading.Lock()
+
+def ensure_schema():
+    # 프로세스당 한 번만 마이그레이션 실행 (이후 호출은 플래그 확인만)
+    global _SCHEMA_READY
+    if _SCHEMA_READY: return
+    with _SCHEMA_LOCK:
+        if _SCHEMA_READY: return
+        with db_connection() as conn:
+            run_migrations(conn)
+        _SCHEMA_READY = True
+
+def check_and_init_db(on_error=None):
+    # 운영 DB 스키마만 준비함 (만세력 DB 는 읽기 전용이라 없어도 새로 만들지 않음)
+    # 실패하면 로그를 남기고 on_error(메시지) 로 알림 (예: app.py 에서 st.error 전달)
+    try:
+        ensure_schema()
+        return True
     except Exception as e:
-        # 여기서 에러가 나면 화면에 출력해서 원인을 알려줌
-        st.error(f"DB 초기화 중 오류 발생: {e}")
-    finally:
-        conn.close()
+        logger.exception("운영 DB 초기화 실패")
+        if on_error: on_error(f"DB 초기화 중 오류 발생: {e}")
+        return False
 
 def login_user(username, password):
-    check_and_init_db() 
-    conn = sqlite3.connect('saju.db')
-    cursor = conn.cursor()
     try:
-        cursor.execute("SELECT name FROM users WHERE username=? AND password=?", (username, password))
-        result = cursor.fetchone()
+        ensure_schema()
+        with db_connection() as conn:
+            result = conn.execute("SELECT name FROM users WHERE username=? AND password=?", (username, password)).fetchone()
         return result[0] if result else None
     except: return None
-    finally: conn.close()
 
 def save_consultation(counselor_id, client_name, gender, b_date, b_time, memo=""):
-    check_and_init_db()
-    conn = sqlite3.connect('saju.db')
-    cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO consultations (counselor_id, client_name, client_gender, birth_date, birth_time, memo) VALUES (?, ?, ?, ?, ?, ?)", (counselor_id, client_name, gender, str(b_date), str(b_time), memo))
-        conn.commit()
+        ensure_schema()
+        with db_connection() as conn:
+            conn.execute("INSERT INTO consultations (counselor_id, client_name, client_gender, birth_date, birth_time, memo) VALUES (?, ?, ?, ?, ?, ?)", (counselor_id, client_name, gender, str(b_date), str(b_time), memo))
+            conn.commit()
         return True
     except: return False
-    finally: conn.close()
 
 def get_my_consultation_history(counselor_id):
-    check_and_init_db()
-    conn = sqlite3.connect('saju.db')
-    cursor = conn.cursor()
     try:
-        cursor.execute("SELECT client_name, client_gender, birth_date, consult_date FROM consultations WHERE counselor_id=? ORDER BY consult_date DESC LIMIT 10", (counselor_id,))
-        rows = cursor.fetchall()
-        return rows
+        ensure_schema()
+        with db_connection() as conn:
+            return conn.execute("SELECT client_name, client_gender, birth_date, consult_date FROM consultations WHERE counselor_id=? ORDER BY consult_date DESC LIMIT 10", (counselor_id,)).fetchall()
     except: return []
-    finally: conn.close()
-
-def get_monthly_ganji(year, month):
-    db_path = get_db_path()
-    if not db_path: return None
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+
+# =========================================================
+# ★ AI 보고서 캐시 (같은 원국 + 모드 + 모델 + 프롬프트 버전이면 Gemini 호출 생략)
+# =========================================================
+REPORT_CACHE_TTL = 7 * 24 * 3600         # 초
+REPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+_REPORT_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+_REPORT_LOCK = threading.Lock()
+
+def _count_report(key, n=1):
+    with _REPORT_LOCK: _REPORT_STATS[key] += n
+
+def report_cache_stats():
+    with _REPORT_LOCK: stats = dict(_REPORT_STATS)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / total if total else 0.0
+    return stats
+
+def make_report_key(result, analysis_mode, model, template_version, **context):
+    """analyze_user 결과(정규화) + 분석 모드 + 모델명 + 프롬프트 템플릿 버전으로 캐시 키를 만듭니다.
+    성명처럼 보고서 본문에 들어가는 값은 context 로 함께 넘깁니다."""
+    payload = json.dumps([result, analysis_mode, model, template_version, context], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_cached_report(cache_key, ttl=None):
+    ttl = REPORT_CACHE_TTL if ttl is None else ttl
     try:
-        # 15일 기준 조회
-        cursor.execute(f"SELECT cd_hyganjee, cd_kyganjee FROM calenda_data WHERE cd_sy={year} AND cd_sm={month} AND cd_sd=15")
-        result = cursor.fetchone()
-        if result: return {"year_ganji": result[0], "month_ganji": result[1]}
-        else: return None
-    except: return None
-    finally: conn.close()
+        ensure_schema()
+        with db_connection() as conn:
+            row = conn.execute("SELECT report, created_at FROM report_cache WHERE cache_key=?", (cache_key,)).fetchone()
+            if row and time.time() - row[1] <= ttl:
+                conn.execute("UPDATE report_cache SET last_used=? WHERE cache_key=?", (time.time(), cache_key))
+                conn.commit()
+                _count_report("hits")
+                return row[0]
+            if row:
+                # 유효기간이 지난 보고서는 삭제
+                conn.execute("DELETE FROM report_cache WHERE cache_key=?", (cache_key,))
+                conn.commit()
+    except Exception:
+        pass
+    _count_report("misses")
+    return None
+
+def save_report(cache_key, analysis_mode, model, template_version, report):
+    try:
+        ensure_schema()
+        now = time.time()
+        with db_connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO report_cache (cache_key, analysis_mode, model, template_version, report, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (cache_key, analysis_mode, model, template_version, report, len(report.encode("utf-8")), now, now))
+            # 유효기간 경과분 삭제 후, 전체 크기가 한도를 넘으면 오래 안 쓴 것부터 삭제
+            evicted = conn.execute("DELETE FROM report_cache WHERE created_at < ?", (now - REPORT_CACHE_TTL,)).rowcount
+            evicted += conn.execute('''
+                DELETE FROM report_cache WHERE cache_key IN (
+                    SELECT cache_key FROM (
+                        SELECT cache_key, SUM(size) OVER (ORDER BY last_used DESC) AS running FROM report_cache
+                    ) WHERE running > ?
+                )
+            ''', (REPORT_CACHE_MAX_BYTES,)).rowcount
+            conn.commit()
+        if evicted > 0: _count_report("evictions", evicted)
+        return True
+    except Exception:
+        return False
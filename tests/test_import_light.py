@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+from manage_db import HEAVY_MODULES
+
+# saju_core 는 배치 / CLI 에서 쓰므로 import 만으로 무거운 모듈을 불러오면 안 됨 (manage_db.py bench-import 와 같은 검사)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_saju_core_import_does_not_load_heavy_modules():
+    probe = f"import sys, saju_core; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True, cwd=ROOT).stdout.strip()
+    assert out == ""
@@ -0,0 +1,45 @@
+import sqlite3
+from datetime import date, timedelta
+
+from saju_core import GANJI_60, CALENDAR_QUERIES, OBSOLETE_CALENDAR_INDEXES, prepare_calendar_db, check_query_plans
+
+# 시작 시 만세력 전체 읽기가 커버링 인덱스 없는 스캔 / 임시 정렬로 되돌아가지 않는지 확인 (manage_db.py check-plans 와 같은 검사)
+
+def _make_calendar_db(path, start=date(1999, 1, 1), days=3 * 366):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE calenda_data (cd_no INTEGER PRIMARY KEY, cd_sy INTEGER, cd_sm INTEGER, cd_sd INTEGER, cd_lm INTEGER, cd_ld INTEGER, cd_hyganjee TEXT, cd_kyganjee TEXT, cd_dyganjee TEXT)")
+    rows = []
+    for i in range(days):
+        d = start + timedelta(days=i)
+        rows.append((d.year, d.month, d.day, (d.month + 10) % 12 + 1, (d.day + 14) % 30 + 1,
+                     GANJI_60[(d.year - 4) % 60], GANJI_60[(d.year * 12 + d.month) % 60], GANJI_60[(d.toordinal() + 14) % 60]))
+    conn.executemany("INSERT INTO calenda_data (cd_sy, cd_sm, cd_sd, cd_lm, cd_ld, cd_hyganjee, cd_kyganjee, cd_dyganjee) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return conn
+
+def test_calendar_queries_use_covering_indexes(tmp_path):
+    conn = _make_calendar_db(tmp_path / "saju.db")
+    try:
+        prepare_calendar_db(conn)
+        assert check_query_plans(conn) == []
+    finally:
+        conn.close()
+
+def test_check_query_plans_reports_scans_without_indexes(tmp_path):
+    # 인덱스가 없으면 모든 명명 쿼리가 문제로 잡혀야 함 (검사 자체가 동작하는지 확인)
+    conn = _make_calendar_db(tmp_path / "saju.db")
+    try:
+        assert {name for name, _ in check_query_plans(conn)} == set(CALENDAR_QUERIES)
+    finally:
+        conn.close()
+
+def test_prepare_calendar_db_drops_unused_indexes(tmp_path):
+    conn = _make_calendar_db(tmp_path / "saju.db")
+    try:
+        conn.execute("CREATE INDEX idx_calenda_lunar ON calenda_data (cd_sy, cd_lm, cd_ld, cd_sm, cd_sd, cd_hyganjee, cd_kyganjee, cd_dyganjee)")
+        prepare_calendar_db(conn)
+        names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert names.isdisjoint(OBSOLETE_CALENDAR_INDEXES)
+        assert check_query_plans(conn) == []
+    finally:
+        conn.close()